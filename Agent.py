@@ -1,191 +1,341 @@
 from collections import deque
-import heapq
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+import time
 
-moves = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-pathMap = {(1, 0): "down", (0, 1): "right", (-1, 0): "up", (0, -1): "left"}
+from Hamiltonian import Hamiltonian
+from Geometry import board_geometry
+from Safety import SafetyEvaluator
+from Regions import RegionMap
+from Strategies import PLANNERS, SCORERS, AgentParams, SearchLimit, phase_strategies
+from config import STRATEGY_PHASES, DECISION_DEADLINE, REGION_MIN_CELLS
 
 class Agent:
-    def __init__(self, rows, columns):
+    def __init__(self, rows, columns, phases = STRATEGY_PHASES, deadline = DECISION_DEADLINE, params = None):
         """
             Initialize the agent with the board dimensions.
 
             :param rows: Number of rows in the board.
             :param columns: Number of columns in the board.
+            :param phases: List of (minimum snake length, planner names, scorer name) selecting the
+                           registered strategies (see Strategies) by snake length.
+            :param deadline: Time budget of a decision in seconds. The planners then run in a thread
+                             pool and the best candidate found in time is used; None runs them in
+                             turn without a limit.
+            :param params: AgentParams (or its dictionary form) of the safety threshold, score
+                           weights and planner order, None for the defaults.
         """
         
         self.rows = rows
         self.columns = columns
 
-    def _is_adjacent_to_body(self, pos, snake):
+        self.geometry = board_geometry(rows, columns)
+        self.hamiltonian = Hamiltonian(rows, columns)
+        # Blocks of cells bounding the searches and flood fills on large boards, None on small ones
+        self.regions = RegionMap(self.geometry) if self.geometry.size > REGION_MIN_CELLS else None
+        self.safety = SafetyEvaluator(self.geometry, regions=self.regions)
+
+        self.phases = phases
+        self.deadline = deadline
+        self.params = AgentParams.fromDict(params) if isinstance(params, dict) else params or AgentParams()
+        # Threads running the planners when a deadline is set, created on first use
+        self.pool = None
+        # Planner name -> (future, SearchLimit) of its last run in the pool
+        self.running = {}
+        # LookaheadPlanner of the "lookahead" planner, created on first use
+        self.lookahead = None
+
+        # Optional Profiler recording every decision; None disables instrumentation
+        self.profiler = None
+        # Optional TranspositionCache answering repeated (body, apple) states; None disables it
+        self.transpositions = None
+        # Number of cells discovered by the last search run without a SearchLimit
+        self.expanded = 0
+
+        # Tail-follow cycle kept between decisions: list of cells and cell -> position map
+        self.tail_cycle = None
+        self.tail_cycle_index = None
+
+    def _is_adjacent_to_body(self, k, snake):
         """
-            Check if a given position is adjacent to the snake's body (excluding the head).
+            Check if a given cell is adjacent to the snake's body (excluding the head).
 
-            :param pos: Tuple (row, col) of the position to check.
+            :param k: Flat index of the cell to check.
             :param snake: Snake object representing the current snake state.
-            :return: True if the position is adjacent to the body, False otherwise.
+            :return: True if the cell is adjacent to the body, False otherwise.
         """
 
-        body = set(snake.getBody())
-        body.discard(snake.getHead())
-        for i, j in body:
-            for di, dj in moves:
-                if (i + di, j + dj) == pos:
-                    return True
+        head = self.geometry.index(snake.getHead())
+        for n in self.geometry.neighbors[k]:
+            if n != head and snake.isOccupiedIndex(n):
+                return True
         return False
 
-    def _is_valid_move(self, pos, snake, depth, body, parent):
+    def _reachable_ratio(self, new_snake_body):
         """
-            Check if a move is valid (inside the board, not colliding with the body or parent path).
+            Compute the ratio of reachable free cells from the snake's head.
 
-            :param pos: Tuple (row, col) of the position to check.
-            :param snake: Snake object representing the current snake state.
-            :param depth: Current depth in path exploration.
-            :param body: List of snake body positions.
-            :param parent: Dictionary of visited positions in current path.
-            :return: True if the move is valid, False otherwise.
+            :param new_snake_body: List of tuples representing the new snake body.
+            :return: Ratio of reachable free cells to total free cells.
         """
 
-        ni, nj = pos
-        if not (0 <= ni < self.rows and 0 <= nj < self.columns):
-            return False
-        if depth < len(body) - 1:
-            future_blocked = set(body[:len(body) - depth])
-        else:
-            future_blocked = {snake.getHead()}
-        return pos not in future_blocked and pos not in parent
+        return self.safety.reachableRatio(new_snake_body)
 
-    def _manhattan(self, a, b):
+    def _searched(self, limit, count):
         """
-            Compute the Manhattan distance between two positions.
+            Record the number of cells discovered by a search.
 
-            :param a: Tuple (row, col) of the first position.
-            :param b: Tuple (row, col) of the second position.
-            :return: Manhattan distance between a and b.
+            :param limit: SearchLimit of the planner call, None to store the count in expanded.
+            :param count: Number of cells.
         """
 
-        return abs(a[0]-b[0]) + abs(a[1]-b[1])
-
-    def _reachable_ratio(self, new_snake_body):
-        """
-            Compute the ratio of reachable free cells from the snake's head.
+        if limit is None:
+            self.expanded = count
+        else:
+            limit.expanded += count
 
-            :param new_snake_body: List of tuples representing the new snake body.
-            :return: Ratio of reachable free cells to total free cells.
+    def _find_path(self, target, snake, use_body_hugging, limit = None):
         """
+            BFS-based pathfinding from the snake's head to a target position.
 
-        head = new_snake_body[0]
-        body_set = set(new_snake_body)
-        visited = {head}
-        q = deque([head])
-
-        while q:
-            x, y = q.popleft()
-            for dx, dy in moves:
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < self.rows and 0 <= ny < self.columns
-                        and (nx, ny) not in body_set
-                        and (nx, ny) not in visited):
-                    visited.add((nx, ny))
-                    q.append((nx, ny))
+            On large boards the search first stays within a corridor of blocks along a
+            coarse route to the target (see Regions.RegionMap), and only searches the
+            whole board if the corridor holds no path.
 
-        total_free = self.rows * self.columns - len(new_snake_body)
-        return len(visited) / max(1, total_free)
+            :param target: Tuple (row, col) of the target position.
+            :param snake: Snake object representing the current snake state.
+            :param use_body_hugging: Boolean, whether to prioritize moves adjacent to the body.
+            :param limit: SearchLimit of the planner call (see Strategies), None for no limit.
+            :return: Tuple (path as list of directions, path length)
+        """
 
-    def _find_path(self, target, snake, use_body_hugging):
+        head = self.geometry.index(snake.getHead())
+        goal = self.geometry.index(target)
+        if self.regions is None:
+            return self._bfs(head, goal, snake, use_body_hugging, None, limit)
+
+        path, length = self._bfs(head, goal, snake, use_body_hugging, self.regions.corridor(snake, head, goal), limit)
+        if path or head == goal or (limit is not None and limit.expired()):
+            return path, length
+        expanded = self.expanded
+        path, length = self._bfs(head, goal, snake, use_body_hugging, None, limit)
+        if limit is None:
+            self.expanded += expanded
+        return path, length
+
+    def _bfs(self, head, goal, snake, use_body_hugging, allowed, limit = None):
         """
-            BFS-based pathfinding from the snake's head to a target position.
+            Breadth-first search of _find_path.
 
-            :param target: Tuple (row, col) of the target position.
+            :param head: Flat index of the snake's head.
+            :param goal: Flat index of the target cell.
             :param snake: Snake object representing the current snake state.
             :param use_body_hugging: Boolean, whether to prioritize moves adjacent to the body.
+            :param allowed: Bytearray of the blocks the search may enter (see Regions.RegionMap.corridor), None for all.
+            :param limit: SearchLimit checked every 256 cells, the search giving up when it expires; None for no limit.
             :return: Tuple (path as list of directions, path length)
         """
 
-        head = snake.getHead()
-        body = list(snake.getBody())
+        geometry = self.geometry
+        blockOf = self.regions.blockOf if allowed is not None else None
+        last = snake.getLength() - 1
+        free_after = snake.freeAfterIndex
         parent = {head: None}
         q = deque([(head, 0)])
+        popped = 0
 
         while q:
-            (ci, cj), depth = q.popleft()
-            if (ci, cj) == target:
+            current, depth = q.popleft()
+            if current == goal:
                 path = []
-                cur = target
+                cur = goal
                 while cur != head:
-                    pi, pj = parent[cur]
-                    path.append(pathMap[(cur[0] - pi, cur[1] - pj)])
-                    cur = (pi, pj)
+                    prev = parent[cur]
+                    path.append(geometry.direction(prev, cur))
+                    cur = prev
                 path.reverse()
+                self._searched(limit, len(parent))
                 return path, len(path)
+            popped += 1
+            if limit is not None and not popped & 255 and limit.expired():
+                break
 
+            # A body segment blocks a cell until the tail has moved past it, so at a given
+            # depth only the segments that have not vacated yet are obstacles
+            blocked = min(depth, last)
             neighbors = []
             if use_body_hugging:
                 high, low = [], []
-                for di, dj in moves:
-                    ni, nj = ci + di, cj + dj
-                    nxt = (ni, nj)
-                    if self._is_valid_move(nxt, snake, depth, body, parent):
+                for nxt in geometry.neighbors[current]:
+                    if nxt not in parent and free_after(nxt) <= blocked and (allowed is None or allowed[blockOf[nxt]]):
                         (high if self._is_adjacent_to_body(nxt, snake) else low).append(nxt)
                 neighbors = high + low
             else:
-                for di, dj in moves:
-                    ni, nj = ci + di, cj + dj
-                    nxt = (ni, nj)
-                    if self._is_valid_move(nxt, snake, depth, body, parent):
+                for nxt in geometry.neighbors[current]:
+                    if nxt not in parent and free_after(nxt) <= blocked and (allowed is None or allowed[blockOf[nxt]]):
                         neighbors.append(nxt)
 
             for nxt in neighbors:
                 if nxt not in parent:
-                    parent[nxt] = (ci, cj)
+                    parent[nxt] = current
                     q.append((nxt, depth + 1))
 
+        self._searched(limit, len(parent))
         return [], 0
 
-    def _a_star(self, target, snake):
+    def _a_star(self, target, snake, limit = None):
         """
             A* pathfinding algorithm from the snake's head to a target position.
 
+            The open set is a bucket queue: f and h are small integers bounded by the
+            board, so every node is filed under the key f * width + h and popped from
+            the lowest non-empty bucket. Ties on f go to the node closest to the goal.
+            Paths are rebuilt from a flat parent array, and a body segment blocks a
+            cell only while it has not vacated at the time the head would enter it.
+
             :param target: Tuple (row, col) of the target position.
             :param snake: Snake object representing the current snake state.
-            :param inverse: Boolean, if True, compute path to tail instead of apple.
+            :param limit: SearchLimit checked every 256 cells, the search giving up when it expires; None for no limit.
             :return: Tuple (path as list of directions, path length)
         """
 
-        head = snake.getHead()
-        body = list(snake.getBody())
-        open_set = []
-        heapq.heappush(open_set, (0 + self._manhattan(head, target), 0, head, [head]))
-        visited = {head}
-
-        while open_set:
-            f, g, current, path = heapq.heappop(open_set)
-            if current == target:
-                moves_path = []
-                for i in range(1, len(path)):
-                    di, dj = path[i][0]-path[i-1][0], path[i][1]-path[i-1][1]
-                    moves_path.append(pathMap[(di, dj)])
-                return moves_path, len(moves_path)
-
-            for di, dj in moves:
-                ni, nj = current[0] + di, current[1] + dj
-                nxt = (ni, nj)
-                if self._is_valid_move(nxt, snake, g, body, {}) and nxt not in visited:
-                    visited.add(nxt)
-                    h = self._manhattan(nxt, target)
-                    heapq.heappush(open_set, (g + 1 + h, g + 1, nxt, path + [nxt]))
-
+        geometry = self.geometry
+        neighbors = geometry.neighbors
+        head = geometry.index(snake.getHead())
+        goal = geometry.index(target)
+        distance = geometry.distanceTo(goal)
+        width = geometry.rows + geometry.columns
+        last = snake.getLength() - 1
+        free_after = snake.freeAfterIndex
+
+        unreached = geometry.size
+        cost = [unreached] * geometry.size
+        parent = [-1] * geometry.size
+        cost[head] = 0
+        key = distance[head] * width + distance[head]
+        buckets = {key: [head]}
+        queued = 1
+        reached = 1
+        popped = 0
+
+        while queued:
+            bucket = buckets.get(key)
+            while not bucket:
+                key += 1
+                bucket = buckets.get(key)
+            current = bucket.pop()
+            queued -= 1
+            g = cost[current]
+            if (g + distance[current]) * width + distance[current] != key:
+                continue  # stale entry, the cell was reached again with a lower cost
+            if current == goal:
+                path = []
+                while current != head:
+                    prev = parent[current]
+                    path.append(geometry.direction(prev, current))
+                    current = prev
+                path.reverse()
+                self._searched(limit, reached)
+                return path, g
+            popped += 1
+            if limit is not None and not popped & 255 and limit.expired():
+                break
+
+            blocked = min(g, last)
+            for nxt in neighbors[current]:
+                if g + 1 < cost[nxt] and free_after(nxt) <= blocked:
+                    if cost[nxt] == unreached:
+                        reached += 1
+                    cost[nxt] = g + 1
+                    parent[nxt] = current
+                    h = distance[nxt]
+                    nkey = (g + 1 + h) * width + h
+                    buckets.setdefault(nkey, []).append(nxt)
+                    queued += 1
+                    if nkey < key:
+                        key = nkey
+
+        self._searched(limit, reached)
         return [], 0
 
-    def _follow_tail(self, snake):
+    def _store_tail_cycle(self, snake, path):
+        """
+            Remember the closed loop formed by the body (tail to head) and a path from the head to the tail.
+
+            :param snake: Snake object representing the current snake state.
+            :param path: List of directions from the head to the tail cell.
+        """
+
+        geometry = self.geometry
+        cycle = snake.getBody()
+        cycle.reverse()
+        k = geometry.index(snake.getHead())
+        for step in path[:-1]:
+            k = geometry.moveTable[step][k]
+            cycle.append(geometry.cells[k])
+
+        index = {cell: k for k, cell in enumerate(cycle)}
+        if len(index) == len(cycle):
+            self.tail_cycle, self.tail_cycle_index = cycle, index
+        else:
+            self.tail_cycle, self.tail_cycle_index = None, None
+
+    def _cached_tail_path(self, snake, apple):
+        """
+            Reuse the stored tail-follow cycle if the snake still lies on it.
+
+            The cycle stays valid while the moves made since it was stored followed it:
+            the body is then a run of consecutive cycle cells ending at the head, and the
+            rest of the cycle is free. Eating on the cycle only lengthens that run.
+
+            :param snake: Snake object representing the current snake state.
+            :param apple: Tuple (row, col) of the apple's position.
+            :return: List of directions along the cycle up to the tail (or the apple), or None.
+        """
+
+        cycle, index = self.tail_cycle, self.tail_cycle_index
+        if cycle is None:
+            return None
+        size = len(cycle)
+        snake_len = snake.getLength()
+        head = snake.getHead()
+        if snake_len >= size or head not in index:
+            return None
+        pos = index[head]
+        for k, cell in enumerate(snake):
+            if cycle[(pos - k) % size] != cell:
+                return None
+
+        path = []
+        prev = head
+        for k in range(1, size - snake_len + 2):
+            cell = cycle[(pos + k) % size]
+            path.append(self.geometry.direction(self.geometry.index(prev), self.geometry.index(cell)))
+            if cell == apple:
+                break
+            prev = cell
+        return path
+
+    def _follow_tail(self, snake, apple=None):
         """
             Compute a path to the snake's tail.
 
+            Consecutive fallbacks keep walking the same loop, so the search only runs
+            when the snake has left the stored cycle.
+
             :param snake: Snake object representing the current snake state.
+            :param apple: Tuple (row, col) of the apple's position; the path stops there if it crosses it.
             :return: List of directions to follow the tail.
         """
 
-        tail = snake.getBody()[-1]
-        return self._find_path(tail, snake, use_body_hugging=False)[0]
+        path = self._cached_tail_path(snake, apple)
+        if path:
+            return path
+
+        tail = snake.getTail()
+        path = self._find_path(tail, snake, use_body_hugging=False)[0]
+        if path:
+            self._store_tail_cycle(snake, path)
+        return path
 
     def compute(self, apple, snake):
         """
@@ -197,50 +347,133 @@ class Agent:
             :return: List of directions ('up', 'down', 'left', 'right') to reach the apple.
         """
 
-        snake_len = len(snake.getBody())
+        profiler = self.profiler
+        cache = self.transpositions
+        if profiler is None and cache is None:
+            return self._decide(apple, snake, None)
+
+        record = None
+        if profiler is not None:
+            start = time.perf_counter()
+            record = profiler.begin(snake.getLength())
+
+        path = None
+        if cache is not None:
+            key = cache.key(snake, apple)
+            cached = cache.get(key)
+            if cached is not None:
+                path = list(cached)
+                if record is not None:
+                    record["cached"] = True
+        if path is None:
+            path = self._decide(apple, snake, record)
+            if cache is not None and path:
+                cache.put(key, path)
+
+        if profiler is not None:
+            profiler.end(record, path, time.perf_counter() - start)
+        return path
+
+    def _decide(self, apple, snake, record):
+        """
+            Decision logic of compute.
+
+            :param apple: Tuple (row, col) of the apple's position.
+            :param snake: Snake object representing the current snake state.
+            :param record: Profiler record to fill with per-check timings, expanded nodes,
+                           flood fills and the fallback used, or None when not profiling.
+            :return: List of directions ('up', 'down', 'left', 'right') to reach the apple.
+        """
+
+        snake_len = snake.getLength()
         total_cells = self.rows * self.columns
-        dynamic_threshold = 0.4 + 0.4 * (snake_len / total_cells)
+        dynamic_threshold = self.params.threshold(snake_len, total_cells)
+        planners, scorer = phase_strategies(self.phases, snake_len)
+        planners = self.params.sort(planners)
         candidates = []
-
-        def simulate_with_growth(path):
-            body = list(snake.getBody())
-            for step in path:
-                di, dj = next(k for k, v in pathMap.items() if v == step)
-                new_head = (body[0][0] + di, body[0][1] + dj)
-                body.insert(0, new_head)
-                if new_head != apple:
-                    body.pop()
-            return body
-
-        checks = [
-            ("BFS", lambda: self._find_path(apple, snake, use_body_hugging=False)),
-            ("BFS body", lambda: self._find_path(apple, snake, use_body_hugging=True)),
-            ("A*", lambda: self._a_star(apple, snake)),
-        ]
-        for tag, finder in checks:
-            path, length = finder()
-            if path:
-                body = simulate_with_growth(path)
-                if self._reachable_ratio(body) >= dynamic_threshold:
-                    ratio = self._reachable_ratio(body)
-                    candidates.append((path, length, ratio, tag))
+        evaluated = set()
+        decision_start = time.perf_counter()
+
+        def consider(name, path, length, expanded, start):
+            tail_reachable = None
+            if path and tuple(path) not in evaluated:
+                evaluated.add(tuple(path))
+                ratio, tail_reachable, _ = self.safety.evaluate(self.safety.endBody(snake, path, apple))
+                if ratio >= dynamic_threshold:
+                    candidates.append((path, length, ratio, name))
+            if record is not None:
+                record["checks"][name] = {
+                    "ms": (time.perf_counter() - start) * 1000,
+                    "expanded": expanded,
+                    "length": length,
+                    "tail_reachable": tail_reachable,
+                }
+
+        if self.deadline is None:
+            for name in planners:
+                start = time.perf_counter()
+                limit = SearchLimit()
+                path, length = PLANNERS[name](self, apple, snake, limit)
+                consider(name, path, length, limit.expanded, start)
+        else:
+            deadline = decision_start + self.deadline
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max(len(names) for _, names, _ in self.phases))
+            # Each planner gets its own copy of the snake, which the caller may change once the
+            # decision is made, and its own SearchLimit. A planner still running from an earlier
+            # decision (it stops at its next check) keeps its thread and sits this one out.
+            futures = {}
+            busy = []
+            for name in planners:
+                previous = self.running.get(name)
+                if previous is not None and not previous[0].done():
+                    busy.append(name)
+                    continue
+                limit = SearchLimit(deadline)
+                future = self.pool.submit(PLANNERS[name], self, apple, snake.copy(), limit)
+                futures[future] = (name, limit)
+                self.running[name] = (future, limit)
+            if busy and record is not None:
+                record["busy"] = busy
+            try:
+                for future in as_completed(futures, timeout=max(0.0, deadline - time.perf_counter())):
+                    name, limit = futures[future]
+                    path, length = future.result()
+                    consider(name, path, length, limit.expanded, decision_start)
+            except FutureTimeout:
+                late = [name for future, (name, _) in futures.items() if not future.done()]
+                for future, (_, limit) in futures.items():
+                    limit.stop.set()
+                if record is not None:
+                    record["late"] = late
+            # Keep the configured order so ties are broken the same way as in turn
+            candidates.sort(key=lambda entry: planners.index(entry[3]))
+
+        if record is not None:
+            record["ratio_calls"] = len(evaluated)
 
         if candidates:
-            def score(entry):
-                path, length, ratio, _ = entry
-                norm_len = length / (self.rows * self.columns)
-                return 0.5 * ratio + 0.5 * (1 - norm_len) 
-            best = max(candidates, key=score)
+            score = SCORERS[scorer]
+            best = max(candidates, key=lambda entry: score(self, entry[0], entry[1], entry[2]))
             return best[0]
 
-        tail_path = self._follow_tail(snake)
+        cycle_path = self.hamiltonian.path(snake, apple)
+        if cycle_path:
+            if record is not None:
+                record["fallback"] = "hamiltonian"
+            return cycle_path
+
+        tail_path = self._follow_tail(snake, apple)
         if tail_path:
+            if record is not None:
+                record["fallback"] = "tail"
             return tail_path
 
-        for di, dj in moves:
-            ni, nj = snake.getHead()[0] + di, snake.getHead()[1] + dj
-            if 0 <= ni < self.rows and 0 <= nj < self.columns:
-                if (ni, nj) not in snake.getBody():
-                    return [pathMap[(di, dj)]]
+        if record is not None:
+            record["fallback"] = "step"
+        head = self.geometry.index(snake.getHead())
+        for n in self.geometry.neighbors[head]:
+            if not snake.isOccupiedIndex(n):
+                return [self.geometry.direction(head, n)]
 
         return []
\ No newline at end of file
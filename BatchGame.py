@@ -0,0 +1,197 @@
+import numpy as np
+
+from Snake import Snake
+from simulation import report
+from config import *
+
+# Move codes accepted by BatchGame.step, as indices into these tables
+DIRECTIONS = ["up", "down", "left", "right"]
+DELTAS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+class BatchGame:
+    def __init__(self, n, rows, cols, seed = None):
+        """
+            Initialize n Snake games that are advanced together.
+
+            Each board is an age grid: every cell holds the move counter at which the head
+            entered it, so a cell is covered by the body while its stamp is within the
+            last length moves of that game, exactly like Snake's occupancy grid.
+
+            :param n: Number of games.
+            :param rows: Number of rows in the game boards.
+            :param cols: Number of columns in the game boards.
+            :param seed: Seed of the generator used to spawn apples, None for a random one.
+        """
+
+        self.n = n
+        self.rows = rows
+        self.cols = cols
+        self.rng = np.random.default_rng(seed)
+
+        body = Snake(rows=rows, columns=cols).getBody()
+        self.placed = np.full((n, rows, cols), -1, dtype=np.int64)
+        for k, (i, j) in enumerate(body):
+            self.placed[:, i, j] = len(body) - 1 - k
+        self.clock = np.full(n, len(body) - 1, dtype=np.int64)
+        self.length = np.full(n, len(body), dtype=np.int64)
+        self.head = np.tile(np.array(body[0], dtype=np.int64), (n, 1))
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.reachedLimit = np.zeros(n, dtype=bool)
+
+        self.apple = np.zeros((n, 2), dtype=np.int64)
+        self.spawnApples(np.arange(n))
+
+    def active(self):
+        """
+            Get the games that are still being played.
+
+            :return: Boolean array of shape (n,).
+        """
+
+        return self.alive & ~self.reachedLimit
+
+    def occupancy(self, games = None):
+        """
+            Get the cells covered by the snakes' bodies.
+
+            :param games: Integer array of game indices, None for all games.
+            :return: Boolean array of shape (len(games), rows, cols).
+        """
+
+        if games is None:
+            games = np.arange(self.n)
+        return self.placed[games] > (self.clock[games] - self.length[games])[:, None, None]
+
+    def spawnApples(self, games):
+        """
+            Spawn an apple in a uniformly random free cell of each given game.
+
+            Games whose board is full have no free cell left and are stopped.
+
+            :param games: Integer array of game indices.
+        """
+
+        free = ~self.occupancy(games).reshape(len(games), -1)
+        keys = self.rng.random(free.shape)
+        keys[~free] = -1.0
+        cells = keys.argmax(axis=1)
+        self.apple[games, 0] = cells // self.cols
+        self.apple[games, 1] = cells % self.cols
+
+        full = ~free.any(axis=1)
+        self.apple[games[full]] = -1
+        self.alive[games[full]] = False
+
+    def step(self, moves):
+        """
+            Advance every active game by one move.
+
+            :param moves: Integer array of shape (n,) with move codes (indices into DIRECTIONS).
+                          Entries of games that are no longer active are ignored.
+        """
+
+        games = np.flatnonzero(self.active())
+        new = self.head[games] + DELTAS[np.asarray(moves)[games]]
+        inside = ((new[:, 0] >= 0) & (new[:, 0] < self.rows) &
+                  (new[:, 1] >= 0) & (new[:, 1] < self.cols))
+        r = np.clip(new[:, 0], 0, self.rows - 1)
+        c = np.clip(new[:, 1], 0, self.cols - 1)
+        hit = self.placed[games, r, c] > self.clock[games] - self.length[games]
+        ok = inside & ~hit
+
+        self.alive[games[~ok]] = False
+        games, new = games[ok], new[ok]
+
+        self.clock[games] += 1
+        self.placed[games, new[:, 0], new[:, 1]] = self.clock[games]
+        self.head[games] = new
+        self.steps[games] += 1
+
+        ate = (new == self.apple[games]).all(axis=1)
+        eaters = games[ate]
+        self.length[eaters] += 1
+        self.score[eaters] += 1
+        if len(eaters):
+            self.spawnApples(eaters)
+
+    def run(self, policy, time_limit = 120.0):
+        """
+            Play every game until it collides or reaches the time limit.
+
+            :param policy: Callable taking this BatchGame and returning an integer array of
+                           shape (n,) with the next move code of each game.
+            :param time_limit: Maximum allowed time per game in seconds.
+        """
+
+        while True:
+            self.reachedLimit |= self.alive & (self.steps * MOVE_INTERVAL >= time_limit)
+            if not self.active().any():
+                break
+            self.step(policy(self))
+
+    def results(self, time_limit = 120.0):
+        """
+            Get the end-of-game results, in the format of simulation.simulate_once.
+
+            :param time_limit: Maximum allowed time per game in seconds.
+            :return: List of tuples (score, steps, time_survived, reached_time_limit).
+        """
+
+        return [
+            (int(score), int(steps), time_limit if reached else int(steps) * MOVE_INTERVAL, bool(reached))
+            for score, steps, reached in zip(self.score, self.steps, self.reachedLimit)
+        ]
+
+    def statistics(self, time_limit = 120.0):
+        """
+            Compute and print the same statistics as simulation.simulate_n_games.
+
+            :param time_limit: Maximum allowed time per game in seconds.
+            :return: Tuple of statistics, see simulation.report.
+        """
+
+        results = self.results(time_limit)
+        return report([r[0] for r in results], [r[2] for r in results],
+                      sum(r[3] for r in results), time_limit)
+
+
+def greedy_policy(batch):
+    """
+        Vectorized one-step policy: move to the safe neighbor closest to the apple.
+
+        :param batch: BatchGame being played.
+        :return: Integer array of shape (n,) with the move code of each game.
+    """
+
+    new = batch.head[:, None, :] + DELTAS[None, :, :]
+    inside = ((new[..., 0] >= 0) & (new[..., 0] < batch.rows) &
+              (new[..., 1] >= 0) & (new[..., 1] < batch.cols))
+    r = np.clip(new[..., 0], 0, batch.rows - 1)
+    c = np.clip(new[..., 1], 0, batch.cols - 1)
+    games = np.arange(batch.n)[:, None]
+    hit = batch.placed[games, r, c] > (batch.clock - batch.length)[:, None]
+
+    distance = np.abs(new - batch.apple[:, None, :]).sum(axis=2)
+    distance[~inside | hit] = batch.rows * batch.cols
+    return distance.argmin(axis=1)
+
+
+def simulate_batch(n, rows=ROWS, cols=COLUMNS, policy=greedy_policy, time_limit=120.0, seed=None):
+    """
+        Simulate n games in lockstep with a vectorized policy and report statistics.
+
+        :param n: Number of games to simulate.
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param policy: Vectorized policy, see BatchGame.run.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :param seed: Seed of the apple generator, None for a random one.
+        :return: Tuple of statistics, see simulation.report.
+    """
+
+    batch = BatchGame(n, rows, cols, seed)
+    batch.run(policy, time_limit)
+    return batch.statistics(time_limit)
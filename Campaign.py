@@ -0,0 +1,296 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from multiprocessing import Pool
+
+from Agent import Agent
+from Results import ResultsSink
+from simulation import simulate_once, report_results
+from config import *
+
+
+def stream_seed(seed, index):
+    """
+        Get the seed of one game of a campaign.
+
+        Seeds are hashed from the campaign seed and the game index, so every game has
+        its own random stream whatever the shard or worker that plays it, and streams of
+        nearby indices or campaign seeds are unrelated.
+
+        :param seed: Campaign seed.
+        :param index: Index of the game in the campaign.
+        :return: 64-bit integer seed.
+    """
+
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _write_atomic(path, data):
+    """
+        Write a JSON file so that it is either fully replaced or left untouched.
+
+        :param path: Output file.
+        :param data: JSON-serializable object.
+    """
+
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+_campaign_config = None
+
+def _init_campaign_worker(rows, cols, time_limit, params):
+    """
+        Store the game settings of a campaign in a pool worker process.
+
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :param params: Keyword arguments of the Agent.
+    """
+
+    global _campaign_config
+    _campaign_config = (rows, cols, time_limit, params)
+
+
+def _play_game(seed):
+    """
+        Play one campaign game with a fresh agent, so its result only depends on its seed.
+
+        :param seed: Seed of the game's random generator.
+        :return: Tuple (score, steps, time_survived, reached_time_limit)
+    """
+
+    rows, cols, time_limit, params = _campaign_config
+    return simulate_once(rows, cols, Agent(rows, cols, **params), time_limit, seed)
+
+
+class Campaign:
+    def __init__(self, directory, n, seed = 0, rows = ROWS, cols = COLUMNS, time_limit = 120.0, params = None,
+                 shard = 0, shards = 1, checkpointEvery = 100):
+        """
+            Initialize a resumable run of seeded games, or one shard of it.
+
+            The shard plays the games whose index is shard modulo shards, in index order.
+            Every checkpointEvery games its rows are appended to <directory>/shard-<k>-of-<m>.csv
+            and the number of games played, the statistics and the CSV size are saved
+            atomically to the matching .json checkpoint. Running the same campaign again
+            resumes after the last checkpoint: rows written after it are dropped and the
+            games replayed, so the results are the same as an uninterrupted run.
+
+            :param directory: Directory holding the checkpoints and results.
+            :param n: Number of games in the whole campaign.
+            :param seed: Campaign seed, see stream_seed.
+            :param rows: Number of rows in the game board.
+            :param cols: Number of columns in the game board.
+            :param time_limit: Maximum allowed time per game in seconds.
+            :param params: Keyword arguments of the Agent (JSON-serializable), None for its defaults.
+            :param shard: Index of the shard played here.
+            :param shards: Number of shards the campaign is split into.
+            :param checkpointEvery: Number of games between checkpoints.
+        """
+
+        self.directory = directory
+        # Normalized through JSON so it compares equal to the copy stored in checkpoints
+        self.config = json.loads(json.dumps({
+            "n": n, "seed": seed, "rows": rows, "cols": cols, "time_limit": time_limit,
+            "params": params or {}, "shard": shard, "shards": shards,
+        }))
+        self.checkpointEvery = checkpointEvery
+
+        name = f"shard-{shard}-of-{shards}"
+        self.checkpointPath = os.path.join(directory, name + ".json")
+        self.resultsPath = os.path.join(directory, name + ".csv")
+        self.completed = 0
+        self.results = ResultsSink(self.resultsPath)
+
+    def indices(self):
+        """
+            Get the game indices of this shard.
+
+            :return: Range of indices.
+        """
+
+        return range(self.config["shard"], self.config["n"], self.config["shards"])
+
+    def load(self):
+        """
+            Restore the last checkpoint, if any.
+
+            :return: Number of games already played by this shard.
+        """
+
+        if not os.path.exists(self.checkpointPath):
+            if os.path.exists(self.resultsPath):
+                os.remove(self.resultsPath)
+            return 0
+
+        with open(self.checkpointPath) as f:
+            checkpoint = json.load(f)
+        if checkpoint["config"] != self.config:
+            raise ValueError(f"{self.checkpointPath} belongs to a campaign with other settings")
+
+        self.completed = checkpoint["completed"]
+        self.results.restore(checkpoint["results"])
+        if os.path.exists(self.resultsPath):
+            with open(self.resultsPath, "r+b") as f:
+                f.truncate(checkpoint["results_size"])
+        return self.completed
+
+    def save(self):
+        """
+            Write the pending rows and an atomic checkpoint.
+        """
+
+        self.results.flush()
+        size = os.path.getsize(self.resultsPath) if os.path.exists(self.resultsPath) else 0
+        _write_atomic(self.checkpointPath, {
+            "config": self.config,
+            "completed": self.completed,
+            "results": self.results.state(),
+            "results_size": size,
+        })
+
+    def run(self, workers = 1):
+        """
+            Play the remaining games of the shard, checkpointing as it goes.
+
+            :param workers: Number of worker processes, 1 to play every game in this process.
+            :return: ResultsSink with the statistics of every game of the shard.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.load()
+
+        config = self.config
+        indices = self.indices()[self.completed:]
+        settings = (config["rows"], config["cols"], config["time_limit"], config["params"])
+
+        def seeds():
+            # Derived from the index range as they are needed, so a shard of any size holds no list of them
+            return (stream_seed(config["seed"], index) for index in indices)
+
+        pool = None
+        if workers > 1:
+            pool = Pool(workers, initializer=_init_campaign_worker, initargs=settings)
+            games = pool.imap(_play_game, seeds(), max(1, min(self.checkpointEvery, len(indices) // (workers * 8))))
+        else:
+            _init_campaign_worker(*settings)
+            games = map(_play_game, seeds())
+
+        try:
+            for seed, (score, steps, time_survived, reached_limit) in zip(seeds(), games):
+                self.results.add(seed, score, steps, time_survived, reached_limit)
+                self.completed += 1
+                if self.completed % self.checkpointEvery == 0:
+                    self.save()
+        finally:
+            self.save()
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        return self.results
+
+
+def merge_shards(directory, output = None):
+    """
+        Merge the shards of a campaign, e.g. copied from several machines into one directory.
+
+        :param directory: Directory holding the shard-<k>-of-<m> checkpoints and results.
+        :param output: CSV file receiving the rows of every shard, None to only merge the statistics.
+        :return: Tuple (ResultsSink with the statistics of all shards, number of missing games).
+    """
+
+    checkpoints = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("shard-") and name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                checkpoints.append((name[:-len(".json")], json.load(f)))
+    if not checkpoints:
+        raise ValueError(f"no campaign shards in {directory}")
+
+    first = dict(checkpoints[0][1]["config"], shard=None)
+    shards = {}
+    for name, checkpoint in checkpoints:
+        if dict(checkpoint["config"], shard=None) != first:
+            raise ValueError(f"{name} belongs to a campaign with other settings")
+        shards[checkpoint["config"]["shard"]] = (name, checkpoint)
+
+    merged = ResultsSink()
+    missing = first["n"]
+    writer = None
+    out = open(output, "w", newline="") if output else None
+    try:
+        if out:
+            writer = csv.writer(out)
+            writer.writerow(ResultsSink.FIELDS)
+        for shard in sorted(shards):
+            name, checkpoint = shards[shard]
+            part = ResultsSink()
+            part.restore(checkpoint["results"])
+            merged.merge(part)
+            missing -= checkpoint["completed"]
+            if writer:
+                with open(os.path.join(directory, name + ".csv"), newline="") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    writer.writerows(reader)
+    finally:
+        if out:
+            out.close()
+    return merged, missing
+
+
+def run_sweep(directory, param_sets, n, seed = 0, workers = 1, time_limit = 120.0):
+    """
+        Run one campaign per set of Agent parameters, all on the same game seeds.
+
+        Each campaign lives in a subdirectory named after a hash of its parameters, so
+        an interrupted sweep resumes every campaign where it stopped, in any order.
+
+        :param directory: Directory holding the campaigns.
+        :param param_sets: List of Agent keyword argument dictionaries.
+        :param n: Number of games per campaign.
+        :param seed: Campaign seed shared by all the parameter sets.
+        :param workers: Number of worker processes.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :return: List of (params, summary dictionary) in the order of param_sets.
+    """
+
+    summaries = []
+    for params in param_sets:
+        key = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=6).hexdigest()
+        campaign = Campaign(os.path.join(directory, key), n, seed, time_limit=time_limit, params=params)
+        summaries.append((params, campaign.run(workers).summary()))
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run or merge a resumable simulation campaign.")
+    parser.add_argument("directory", help="campaign directory (checkpoints and results)")
+    parser.add_argument("--games", type=int, default=1000, help="games in the whole campaign")
+    parser.add_argument("--seed", type=int, default=0, help="campaign seed")
+    parser.add_argument("--time-limit", type=float, default=120.0, help="time limit per game in seconds")
+    parser.add_argument("--params", default="{}", help="Agent keyword arguments as JSON")
+    parser.add_argument("--shard", type=int, default=0, help="index of the shard to play")
+    parser.add_argument("--shards", type=int, default=1, help="number of shards")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--merge", metavar="CSV", help="merge the shards of the directory into this CSV file")
+    args = parser.parse_args()
+
+    if args.merge:
+        results, missing = merge_shards(args.directory, args.merge)
+        if missing:
+            print(f"{missing} games not played yet")
+    else:
+        campaign = Campaign(args.directory, args.games, args.seed, time_limit=args.time_limit,
+                            params=json.loads(args.params), shard=args.shard, shards=args.shards)
+        results = campaign.run(args.workers)
+    report_results(results, args.time_limit)
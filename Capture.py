@@ -0,0 +1,136 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+class Capture(ABC):
+    # Channel layout of the frames returned by grab, e.g. "RGB" or "BGRA"
+    channels = "RGB"
+
+    @abstractmethod
+    def grab(self):
+        """
+            Get the current frame of the board. Backends must implement this method.
+
+            :return: uint8 NumPy array of shape (height, width, len(channels)).
+        """
+
+    def close(self):
+        """
+            Release the resources held by the backend.
+        """
+
+        pass
+
+
+class MssCapture(Capture):
+    channels = "BGRA"
+
+    def __init__(self, left, top, width, height):
+        """
+            Initialize a screen capture backend that keeps one mss handle open for the whole game.
+
+            :param left: X-coordinate of the left border of the captured region.
+            :param top: Y-coordinate of the top border of the captured region.
+            :param width: Width of the captured region in pixels.
+            :param height: Height of the captured region in pixels.
+        """
+
+        import mss
+
+        self.handle = mss.mss()
+        self.region = {"left": left, "top": top, "width": width, "height": height}
+
+    def grab(self):
+        """
+            Capture the region and expose the raw BGRA buffer without copying it.
+
+            :return: uint8 NumPy array of shape (height, width, 4).
+        """
+
+        shot = self.handle.grab(self.region)
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def close(self):
+        """
+            Close the mss handle.
+        """
+
+        self.handle.close()
+
+
+class PILCapture(Capture):
+    def __init__(self, left, top, width, height):
+        """
+            Initialize a screen capture backend based on PIL's ImageGrab.
+
+            :param left: X-coordinate of the left border of the captured region.
+            :param top: Y-coordinate of the top border of the captured region.
+            :param width: Width of the captured region in pixels.
+            :param height: Height of the captured region in pixels.
+        """
+
+        from PIL import ImageGrab
+
+        self.imageGrab = ImageGrab
+        self.box = (left, top, left + width, top + height)
+
+    def grab(self):
+        """
+            Capture the region with ImageGrab.
+
+            :return: uint8 NumPy array in the image's own mode (RGB or RGBA).
+        """
+
+        image = self.imageGrab.grab(bbox = self.box)
+        self.channels = image.mode
+        return np.asarray(image)
+
+
+class ReplayCapture(Capture):
+    def __init__(self, frames, channels = "RGB", loop = False):
+        """
+            Initialize a backend that serves recorded frames instead of the screen, for headless runs.
+
+            :param frames: List of frames, each a NumPy array or the path of a .npy file
+                           (memory-mapped) or of an image file.
+            :param channels: Channel layout of the frames (image files are converted to RGB).
+            :param loop: Boolean, if True start again from the first frame after the last one;
+                         otherwise keep returning the last frame.
+        """
+
+        self.frames = list(frames)
+        self.channels = channels
+        self.loop = loop
+        self.index = 0
+
+    def _load(self, frame):
+        """
+            Turn a recorded frame into an array.
+
+            :param frame: NumPy array or file path.
+            :return: uint8 NumPy array.
+        """
+
+        if not isinstance(frame, str):
+            return frame
+        if frame.endswith(".npy"):
+            return np.load(frame, mmap_mode = "r")
+
+        from PIL import Image as PILImage
+
+        self.channels = "RGB"
+        return np.asarray(PILImage.open(frame).convert("RGB"))
+
+    def grab(self):
+        """
+            Get the next recorded frame.
+
+            :return: uint8 NumPy array of shape (height, width, len(channels)).
+        """
+
+        frame = self._load(self.frames[self.index])
+        if self.index + 1 < len(self.frames):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+        return frame
@@ -1,25 +1,192 @@
-import keyboard
+import os
+import struct
+import time
+from abc import ABC, abstractmethod
 
-class Control:
+class ControlError(RuntimeError):
+    """
+        Raised when a backend fails to send a key to the game.
+    """
+
+
+class Control(ABC):
     def __init__(self):
         """
-            Initialize the control handler for simulating keyboard input.
+            Initialize the control handler for sending keyboard input to the game.
+
+            Backends implement send; this class counts the keys, measures how long each
+            send takes and turns backend failures into ControlError.
         """
 
-        pass
+        self.sent = 0
+        self.sendTime = 0
+        self.worstSend = 0
+
+    @abstractmethod
+    def send(self, key):
+        """
+            Press and release a key. Backends must implement this method.
+
+            :param key: Key name ('up', 'down', 'left', 'right' or 'space').
+        """
+
+    def press(self, key):
+        """
+            Send a key and measure the call.
+
+            :param key: Key name ('up', 'down', 'left', 'right' or 'space').
+            :return: Time at which the key was sent, in perf_counter_ns nanoseconds.
+        """
+
+        start = time.perf_counter_ns()
+        try:
+            self.send(key)
+        except (OSError, ValueError, ImportError) as e:
+            raise ControlError(f"{type(self).__name__} failed to send {key!r}: {e}") from e
+        duration = time.perf_counter_ns() - start
+        self.sent += 1
+        self.sendTime += duration
+        self.worstSend = max(self.worstSend, duration)
+        return start
 
     def makeMove(self, move):
         """
             Send a keyboard command to move the snake.
 
             :param move: String ('up', 'down', 'left', 'right') representing the movement direction.
+            :return: Time at which the key was sent, in perf_counter_ns nanoseconds.
         """
 
-        keyboard.press_and_release(move)
+        return self.press(move)
 
     def start(self):
         """
             Start the game by sending the 'space' key press.
         """
-        
-        keyboard.press_and_release("space")
\ No newline at end of file
+
+        self.press("space")
+
+    def summary(self):
+        """
+            Summarize the keys sent so far.
+
+            :return: Dictionary with the number of keys and the mean and worst send duration in microseconds.
+        """
+
+        return {
+            "keys": self.sent,
+            "mean_send_us": self.sendTime / max(1, self.sent) / 1000,
+            "worst_send_us": self.worstSend / 1000,
+        }
+
+    def close(self):
+        """
+            Release the resources held by the backend.
+        """
+
+        pass
+
+
+class KeyboardControl(Control):
+    def __init__(self):
+        """
+            Initialize a backend sending keys with the keyboard package (portable, one call per key).
+        """
+
+        import keyboard
+
+        super().__init__()
+        self.keyboard = keyboard
+
+    def send(self, key):
+        self.keyboard.press_and_release(key)
+
+
+class UinputControl(Control):
+    # Linux input constants (linux/input-event-codes.h, linux/uinput.h)
+    EV_SYN, EV_KEY, SYN_REPORT = 0, 1, 0
+    KEYS = {"up": 103, "down": 108, "left": 105, "right": 106, "space": 57}
+    UI_SET_EVBIT = 0x40045564
+    UI_SET_KEYBIT = 0x40045565
+    UI_DEV_CREATE = 0x5501
+    UI_DEV_DESTROY = 0x5502
+    EVENT = struct.Struct("llHHi")  # struct input_event: timeval, type, code, value
+
+    def __init__(self, device = "/dev/uinput", settle = 0.2):
+        """
+            Initialize a backend sending keys through a virtual Linux keyboard.
+
+            The device is created once and kept open for the whole game; a key press and
+            release, with their sync reports, go to the kernel in a single write. Needs
+            write access to /dev/uinput (e.g. the input group or root), no extra package.
+
+            :param device: Path of the uinput device node.
+            :param settle: Time in seconds to wait after creating the device, so the
+                           display server picks it up before the first key.
+        """
+
+        import fcntl
+
+        super().__init__()
+        self.ioctl = fcntl.ioctl
+        self.fd = os.open(device, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            self.ioctl(self.fd, self.UI_SET_EVBIT, self.EV_KEY)
+            for code in self.KEYS.values():
+                self.ioctl(self.fd, self.UI_SET_KEYBIT, code)
+            # struct uinput_user_dev: name, input_id (bus, vendor, product, version), ff_effects_max, abs arrays
+            setup = struct.pack("80sHHHHi", b"snake-agent", 0x06, 0x1, 0x1, 1, 0) + bytes(4 * 64 * 4)
+            os.write(self.fd, setup)
+            self.ioctl(self.fd, self.UI_DEV_CREATE)
+        except OSError:
+            os.close(self.fd)
+            raise
+        time.sleep(settle)
+
+        # Pre-packed press, sync, release, sync events of every key
+        syn = self.EVENT.pack(0, 0, self.EV_SYN, self.SYN_REPORT, 0)
+        self.events = {
+            key: self.EVENT.pack(0, 0, self.EV_KEY, code, 1) + syn + self.EVENT.pack(0, 0, self.EV_KEY, code, 0) + syn
+            for key, code in self.KEYS.items()
+        }
+
+    def send(self, key):
+        events = self.events[key]
+        if os.write(self.fd, events) != len(events):
+            raise OSError("short write to uinput device")
+
+    def close(self):
+        """
+            Destroy the virtual keyboard.
+        """
+
+        if self.fd is None:
+            return
+        try:
+            self.ioctl(self.fd, self.UI_DEV_DESTROY)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+
+class RecordingControl(Control):
+    def __init__(self, onKey = None):
+        """
+            Initialize a backend that records the keys instead of sending them, for headless runs and tests.
+
+            :param onKey: Optional callable onKey(key, timestamp) called for every key, e.g. to drive a simulated game.
+        """
+
+        super().__init__()
+        self.onKey = onKey
+        self.keys = []
+
+    def send(self, key):
+        timestamp = time.perf_counter_ns()
+        self.keys.append((timestamp, key))
+        if self.onKey is not None:
+            self.onKey(key, timestamp)
+
+
+# Input backends by name (config.INPUT_BACKEND)
+CONTROLS = {"keyboard": KeyboardControl, "uinput": UinputControl, "recording": RecordingControl}
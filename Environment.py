@@ -1,43 +1,108 @@
+import json
+import os
 import time
+import queue
+import collections
+import threading
 
-from Control import Control
+from Control import KeyboardControl
 from Image import Image
 from Agent import Agent
 from Snake import Snake
-
-directionMap = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+from Scheduler import Scheduler
+from Geometry import board_geometry
 
 class Environment:
-    def __init__(self, rows, columns, tileSize, top, left, moveInterval):
+    def __init__(self, rows, columns, tileSize, top, left, moveInterval, control = None, capture = None):
         """
             Initialize the environment that orchestrates the game automation.
 
             :param rows: Number of rows in the board.
             :param columns: Number of columns in the board.
-            :param tileSize: Size of each tile in pixels.
+            :param tileSize: Distance in pixels between the starts of consecutive tiles (see Image).
             :param top: Y-coordinate of the top-left corner of the board.
             :param left: X-coordinate of the top-left corner of the board.
             :param moveInterval: Time between moves in seconds.
+            :param control: Input backend sending the keys (see Control.CONTROLS), None to use the keyboard package.
+            :param capture: Capture backend providing the frames (see Capture), None to capture the screen.
         """
     
-        self.control = Control()
-        self.image = Image(rows, columns, tileSize, top, left)
+        self.control = control or KeyboardControl()
+        self.image = Image(rows, columns, tileSize, top, left, capture)
         self.agent = Agent(rows, columns)
-        self. snake = Snake()
+        self.geometry = board_geometry(rows, columns)
+        self.snake = Snake(rows=rows, columns=columns)
 
         self.apple = None
+        self.steps = 0
+        self.resyncs = 0
         self.pathDirections = None
-        self.nextMoveTime = None
 
         self.moveInterval = moveInterval
+        self.scheduler = Scheduler(moveInterval)
+
+        # Fixed key-to-visible-move latency in seconds, None to use the last measured one
+        self.inputLatency = None
+        # Measure the latency by turning the snake when the game starts (see calibrateLatency)
+        self.calibrate = False
+        self.latencySamples = []
+        # JSON file keeping the last measured latency (see saveLatency), None to keep none
+        self.latencyFile = None
+
+        # Optional Trace.TraceWriter recording the moves, apples and decisions; None records nothing
+        self.trace = None
 
     def setApple(self):
         """
-            Continuously search for the apple's position until found.
+            Continuously read the board until the apple is found, checking the snake against each frame.
         """
         
         while not self.apple:
-            self.apple = self.image.findApple()
+            self.apple, cells = self.image.readBoard()
+            self.reconcileSnake(cells)
+
+    def reconcileSnake(self, cells):
+        """
+            Correct the dead-reckoned snake with the snake tiles seen on the board.
+
+            The seen tiles are chained from the head into an ordered body. The model is kept
+            when it matches, when the frame is one move behind it, or when the tiles do not
+            form a single chain starting near the modeled head; otherwise the snake is rebuilt
+            from what was seen.
+
+            :param cells: Set of (row, column) tiles covered by the snake in the frame.
+        """
+
+        body = self.snake.getBody()
+        if not cells or cells == set(body):
+            return
+
+        def neighbors(cell):
+            return [self.geometry.cells[n] for n in self.geometry.neighbors[self.geometry.index(cell)]]
+
+        # The head is an end of the chain: take the end closest to the modeled head
+        rank = {cell: k for k, cell in enumerate(body)}
+        headX, headY = body[0]
+        ends = [c for c in cells if sum(n in cells for n in neighbors(c)) <= 1] or list(cells)
+        head = min(ends, key=lambda c: (abs(c[0] - headX) + abs(c[1] - headY), rank.get(c, len(body))))
+        chain = [head]
+        seen = {head}
+        while True:
+            options = [cell for cell in neighbors(chain[-1]) if cell in cells and cell not in seen]
+            if not options:
+                break
+            nxt = min(options, key=lambda c: rank.get(c, len(body)))
+            chain.append(nxt)
+            seen.add(nxt)
+
+        if len(chain) != len(cells) or chain[:len(body) - 1] == body[1:]:
+            return
+        if abs(head[0] - headX) + abs(head[1] - headY) > 2:
+            return
+        self.snake = Snake(chain, rows=self.snake.rows, columns=self.snake.columns)
+        self.resyncs += 1
+        if self.trace is not None:
+            self.trace.resync(self.snake, self.apple)
 
     def updateSnake(self, direction):
         """
@@ -46,10 +111,9 @@ class Environment:
             :param direction: String representing the move direction.
         """
 
-        headX, headY = self.snake.getHead()
-        dx, dy = directionMap[direction]
-        newHead = (headX + dx, headY + dy)
+        newHead = self.geometry.cells[self.geometry.moveTable[direction][self.geometry.index(self.snake.getHead())]]
         self.snake.move(newHead, newHead == self.apple)
+        self.steps += 1
 
     def makeMove(self, direction):
         """
@@ -58,31 +122,301 @@ class Environment:
             :param direction: String representing the move direction.
         """
 
-        if not self.nextMoveTime: 
-            self.control.makeMove(direction)
-            self.nextMoveTime = time.time() + self.moveInterval + 0.030
-        else:
-            while time.time() < self.nextMoveTime:
-                time.sleep(0.005) 
+        self.scheduler.dispatch(lambda: self.control.makeMove(direction))
+        if self.trace is not None:
+            self.trace.move(direction, self.apple)
+        self.updateSnake(direction)
 
-            self.control.makeMove(direction)
-            self.nextMoveTime += self.moveInterval
+    def decide(self, apple, snake):
+        """
+            Ask the agent for a path, recording the decision time when tracing.
 
-        self.updateSnake(direction)
+            :param apple: Tuple (row, col) of the apple's position.
+            :param snake: Snake object to plan from.
+            :return: List of directions.
+        """
+
+        if self.trace is None:
+            return self.agent.compute(apple, snake)
+        start = time.perf_counter()
+        path = self.agent.compute(apple, snake)
+        self.trace.decision(len(path), time.perf_counter() - start)
+        return path
+
+    def calibrateLatency(self, samples = 6, timeout = 1.0):
+        """
+            Measure the latency between sending a key and seeing its move on the board.
+
+            The snake is turned samples times (zigzagging across its starting direction) and
+            each turn is timed from the key press to the first frame where the head enters a
+            tile in the new direction. Turns are sent at evenly spread delays after a tick, so
+            the wait for the next game tick averages half an interval and the fixed part of
+            the latency (input handling plus rendering and capture) is the mean latency
+            minus half an interval.
+
+            The snake keeps moving during and after the measurement: every move seen is fed
+            to the scheduler as a tick, so the first move is sent in phase with the game,
+            and the snake model is rebuilt from the heads seen, then moved on along its
+            last direction for the ticks since the last one.
+
+            :param samples: Number of turns to time.
+            :param timeout: Time in seconds to wait for a move before giving up.
+            :return: Fixed latency in seconds, None if no turn could be timed.
+        """
+
+        interval = self.scheduler.interval
+        limit = int(timeout * 1e9)
+        state = {"cells": None, "time": None}
+        heads = []
+
+        def nextStep():
+            # Wait for the head to enter a new tile: (step vector, time seen) or None on timeout
+            deadline = time.perf_counter_ns() + limit
+            while time.perf_counter_ns() < deadline:
+                now = time.perf_counter_ns()
+                _, cells = self.image.readBoard()
+                last, seen = state["cells"], state["time"]
+                state["cells"], state["time"] = cells, now
+                new = cells - last if cells and last else set()
+                if len(new) != 1:
+                    continue
+                head = new.pop()
+                previous = heads[-1] if heads else None
+                heads.append(head)
+                if previous is not None and abs(head[0] - previous[0]) + abs(head[1] - previous[1]) == 1:
+                    # The move happened between the two captures
+                    self.scheduler.observeTick(now)
+                    return (head[0] - previous[0], head[1] - previous[1]), (seen + now) // 2
+            return None
+
+        names = {(-1, 0): "up", (1, 0): "down", (0, -1): "left", (0, 1): "right"}
+        latencies = []
+        horizontal = "right"
+        for k in range(samples):
+            observed = nextStep()
+            if observed is None:
+                print(f"Latency calibration: no move seen within {timeout} s, {k} of {samples} turns timed")
+                break
+            step, seen = observed
+            if step[0] == 0:
+                horizontal = names[step]
+                key, wanted = ("up", (-1, 0)) if k % 4 == 0 else ("down", (1, 0))
+            else:
+                key = horizontal
+                wanted = (0, 1) if key == "right" else (0, -1)
+
+            self.scheduler.waitUntil(seen + (2 * k + 1) * interval // (2 * samples))
+            sent = self.control.press(key)
+            while observed is not None and observed[0] != wanted:
+                observed = nextStep()
+            if observed is None:
+                print(f"Latency calibration: the {key!r} turn was not seen within {timeout} s, "
+                      f"{k} of {samples} turns timed")
+                break
+            latencies.append(observed[1] - sent)
+
+        cells = state["cells"]
+        if cells and len(heads) >= len(cells) and set(heads[-len(cells):]) == cells:
+            self.snake = Snake(heads[:-len(cells) - 1:-1], rows=self.snake.rows, columns=self.snake.columns)
+            # The last step gives the direction to move on in; a skipped capture leaves none
+            head = self.geometry.index(heads[-1])
+            previous = self.geometry.index(heads[-2]) if len(heads) >= 2 else None
+            if previous not in self.geometry.neighbors[head]:
+                raise RuntimeError("latency calibration lost track of the snake")
+            direction = self.geometry.direction(previous, head)
+            self.scheduler.applyTicks()
+            for _ in range((time.perf_counter_ns() - self.scheduler.lastTick) // interval):
+                head = self.geometry.moveTable[direction][head]
+                if head < 0:
+                    break
+                self.snake.move(self.geometry.cells[head], False)
+        elif latencies:
+            raise RuntimeError("latency calibration lost track of the snake")
+
+        self.latencySamples = [latency / 1e9 for latency in latencies]
+        if not latencies:
+            return None
+        return max(0.0, (sum(latencies) / len(latencies) - interval / 2) / 1e9)
+
+    def saveLatency(self, latency):
+        """
+            Keep a measured latency in latencyFile for the next games, replacing the file atomically.
+
+            :param latency: Fixed latency in seconds (see calibrateLatency).
+        """
+
+        tmp = self.latencyFile + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"latency_s": latency, "samples_s": self.latencySamples,
+                       "interval_s": self.scheduler.interval / 1e9}, f, indent=2)
+        os.replace(tmp, self.latencyFile)
+
+    def loadLatency(self):
+        """
+            Get the latency kept by saveLatency.
+
+            :return: Fixed latency in seconds, None if there is no latencyFile or it does not exist yet.
+        """
+
+        if not self.latencyFile or not os.path.exists(self.latencyFile):
+            return None
+        with open(self.latencyFile) as f:
+            return json.load(f)["latency_s"]
+
+    def startGame(self):
+        """
+            Start the game, time the input latency if asked to (see calibrate) and feed it to the move scheduler.
+
+            Without a measurement the latency is inputLatency, or else the last one measured
+            (see loadLatency); the scheduler's default only applies when neither is known.
+        """
+
+        self.control.start()
+        time.sleep(0.5)
+        latency = self.inputLatency
+        if latency is None:
+            latency = self.loadLatency()
+        if self.calibrate:
+            measured = self.calibrateLatency()
+            if measured is not None:
+                print(f"Input latency: {measured * 1000:.1f} ms ({len(self.latencySamples)} turns)")
+                latency = measured
+                if self.latencyFile:
+                    self.saveLatency(measured)
+        if latency is not None:
+            self.scheduler.setLatency(latency)
+        if self.trace is not None:
+            self.trace.start(self.snake, None)
 
     def play(self):
         """
             Start and continuously play the game using the agent's strategy.
         """
         
-        self.control.start()
-        time.sleep(0.5)
+        self.startGame()
 
         while True:
             self.setApple()
-            self.pathDirections = self.agent.compute(self.apple, self.snake)
+            if self.agent.profiler is not None:
+                self.agent.profiler.context = {"live": True, "step": self.steps}
+            self.pathDirections = self.decide(self.apple, self.snake)
 
             for direction in self.pathDirections:
                 self.makeMove(direction)
 
             self.apple = None
+
+    def captureLoop(self, apples, stop):
+        """
+            Capture stage: keep reading the board and publish every newly spawned apple
+            with the snake tiles of the frame it was seen in.
+            Each change of the snake tiles is a game tick, fed to the scheduler's calibration.
+
+            :param apples: Queue receiving (apple, cells) pairs.
+            :param stop: Event that ends the loop when set.
+        """
+
+        last = None
+        lastCells = None
+        while not stop.is_set():
+            apple, cells = self.image.readBoard()
+            if cells and lastCells and cells != lastCells:
+                self.scheduler.observeTick(time.perf_counter_ns())
+            lastCells = cells
+            if apple and apple != last:
+                apples.put((apple, cells))
+                last = apple
+            time.sleep(0.002)
+
+    def planLoop(self, apples, moves, ready, stop):
+        """
+            Planning stage: plan each apple from the state the snake will have once the
+            moves already queued are executed, so the next path is ready while the current
+            one is still being played.
+
+            Before planning an apple the snake is reconciled with the frame the apple was
+            seen in, and the plan is rebased on it by replaying the queued moves on a copy.
+            Moves still queued when a new apple shows up were planned for an apple the game
+            has already taken, so the model had drifted: they are dropped first.
+
+            :param apples: Queue providing (apple, cells) pairs from the capture stage.
+            :param moves: Deque of (direction, apple) pairs queued for the move scheduler.
+            :param ready: Condition guarding moves and self.snake, notified when moves are queued.
+            :param stop: Event that ends the loop when set.
+        """
+
+        while not stop.is_set():
+            try:
+                apple, cells = apples.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            with ready:
+                moves.clear()
+                self.reconcileSnake(cells)
+
+            # Tail-following paths may not reach the apple: keep planning until it is eaten,
+            # or until a newer apple shows the game took it elsewhere
+            eaten = False
+            while not eaten and apples.empty() and not stop.is_set():
+                with ready:
+                    planned = self.snake.copy()
+                    for direction, _ in moves:
+                        newHead = self.geometry.cells[self.geometry.moveTable[direction][self.geometry.index(planned.getHead())]]
+                        planned.move(newHead, newHead == apple)
+                if self.agent.profiler is not None:
+                    self.agent.profiler.context = {"live": True, "step": self.steps, "queued": len(moves)}
+                path = self.decide(apple, planned)
+                if not path:
+                    stop.set()
+                    break
+                with ready:
+                    for direction in path:
+                        newHead = self.geometry.cells[self.geometry.moveTable[direction][self.geometry.index(planned.getHead())]]
+                        eaten = newHead == apple
+                        planned.move(newHead, eaten)
+                        moves.append((direction, apple))
+                        if eaten:
+                            break
+                    ready.notify()
+
+    def playPipelined(self):
+        """
+            Play the game with capture, planning and key dispatch running concurrently.
+
+            The capture and planning stages run in background threads; this thread is the
+            move scheduler, sending each queued move on its deadline. A move is applied to
+            the snake model when it is taken from the queue, so the model and the queued
+            moves always add up to the state the planning stage plans from.
+        """
+
+        apples = queue.Queue()
+        moves = collections.deque()
+        ready = threading.Condition()
+        stop = threading.Event()
+
+        self.startGame()
+
+        stages = [
+            threading.Thread(target=self.captureLoop, args=(apples, stop), daemon=True),
+            threading.Thread(target=self.planLoop, args=(apples, moves, ready, stop), daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            while True:
+                with ready:
+                    while not moves and not stop.is_set():
+                        ready.wait(0.1)
+                    if not moves:
+                        break
+                    direction, self.apple = moves.popleft()
+                    self.updateSnake(direction)
+                self.scheduler.dispatch(lambda: self.control.makeMove(direction))
+                if self.trace is not None:
+                    self.trace.move(direction, self.apple)
+        finally:
+            stop.set()
+            for stage in stages:
+                stage.join()
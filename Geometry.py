@@ -0,0 +1,179 @@
+import os
+import pickle
+import random
+
+# Moves in the order the searches expand them, and the direction name of each
+moves = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+pathMap = {(1, 0): "down", (0, 1): "right", (-1, 0): "up", (0, -1): "left"}
+
+# Board sizes (rows, columns) of the Google Snake settings
+BOARD_SIZES = {"small": (9, 10), "normal": (15, 17), "large": (21, 24)}
+
+# Geometries already built, keyed by board size (rows, columns)
+_geometries = {}
+
+
+def board_size(profile):
+    """
+        Get the dimensions of a board profile.
+
+        :param profile: Name in BOARD_SIZES, or a custom size as "<rows>x<columns>" or (rows, columns).
+        :return: Tuple (rows, columns).
+    """
+
+    if isinstance(profile, str):
+        if profile in BOARD_SIZES:
+            return BOARD_SIZES[profile]
+        try:
+            rows, columns = (int(n) for n in profile.lower().split("x"))
+        except ValueError:
+            raise ValueError(f"unknown board profile {profile!r}") from None
+    else:
+        rows, columns = profile
+    if rows < 4 or columns < 5:
+        raise ValueError(f"board {rows}x{columns} is too small for a snake of length 4")
+    return rows, columns
+
+
+def start_body(rows, columns, length = 4):
+    """
+        Get the body of a new snake: horizontal on the middle row, heading right from the left quarter.
+
+        On the normal board this is (7, 4), (7, 3), (7, 2), (7, 1), as in Google Snake.
+
+        :param rows: Number of rows in the board.
+        :param columns: Number of columns in the board.
+        :param length: Number of segments.
+        :return: Tuple of (row, column) tuples, head first.
+    """
+
+    row = rows // 2
+    head = max(columns // 4, length - 1)
+    return tuple((row, head - k) for k in range(length))
+
+class Geometry:
+    def __init__(self, rows, columns):
+        """
+            Precompute the tables of a board size. Cells are referred to by their flat
+            index row * columns + column, which sorts like the (row, column) tuples.
+
+            :param rows: Number of rows in the board.
+            :param columns: Number of columns in the board.
+        """
+
+        self.rows = rows
+        self.columns = columns
+        self.size = rows * columns
+
+        # Flat index -> (row, column)
+        self.cells = [(i, j) for i in range(rows) for j in range(columns)]
+        # Flat index -> in-board neighbor indices, in `moves` order
+        self.neighbors = []
+        # Direction name -> list giving, per flat index, the index reached by that move or -1
+        self.moveTable = {name: [-1] * self.size for name in pathMap.values()}
+        # Index difference between adjacent cells -> direction name
+        self.directionTable = {di * columns + dj: name for (di, dj), name in pathMap.items()}
+
+        for k, (i, j) in enumerate(self.cells):
+            adjacent = []
+            for (di, dj), name in pathMap.items():
+                ni, nj = i + di, j + dj
+                if 0 <= ni < rows and 0 <= nj < columns:
+                    adjacent.append(ni * columns + nj)
+                    self.moveTable[name][k] = ni * columns + nj
+            self.neighbors.append(adjacent)
+
+        # Body of a new snake on this board, head first
+        self.startBody = start_body(rows, columns)
+
+        # Target index -> Manhattan distances of every cell to it, filled on first use
+        self.distances = [None] * self.size
+
+        # Zobrist keys, drawn from a fixed seed so hashes agree across processes and runs:
+        # per cell for the head, the tail and the apple, and per (cell, direction code) for
+        # the link from a segment to the next one towards the tail
+        rng = random.Random(f"zobrist:{rows}x{columns}")
+        self.zobristHead = [rng.getrandbits(64) for _ in range(self.size)]
+        self.zobristTail = [rng.getrandbits(64) for _ in range(self.size)]
+        self.zobristApple = [rng.getrandbits(64) for _ in range(self.size)]
+        self.zobristLink = [rng.getrandbits(64) for _ in range(4 * self.size)]
+        # Index difference between adjacent cells -> direction code (position in `moves`)
+        self.directionCode = {di * columns + dj: code for code, (di, dj) in enumerate(moves)}
+
+    def index(self, pos):
+        """
+            Get the flat index of a cell.
+
+            :param pos: Tuple (row, col) of the cell.
+            :return: Flat index of the cell.
+        """
+
+        return pos[0] * self.columns + pos[1]
+
+    def direction(self, a, b):
+        """
+            Get the move that goes from a cell to an adjacent one.
+
+            :param a: Flat index of the start cell.
+            :param b: Flat index of the adjacent end cell.
+            :return: Direction string ('up', 'down', 'left', 'right').
+        """
+
+        return self.directionTable[b - a]
+
+    def linkKey(self, a, b):
+        """
+            Get the Zobrist key of the link between two adjacent body segments.
+
+            :param a: Flat index of a segment.
+            :param b: Flat index of the next segment towards the tail.
+            :return: 64-bit key.
+        """
+
+        return self.zobristLink[4 * a + self.directionCode[b - a]]
+
+    def distanceTo(self, target):
+        """
+            Get the Manhattan distance of every cell to a target cell.
+
+            Rows of the all-pairs table are built the first time their target is asked
+            for, so large boards only pay for the targets actually used.
+
+            :param target: Flat index of the target cell.
+            :return: List of distances indexed by flat cell index.
+        """
+
+        table = self.distances[target]
+        if table is None:
+            ti, tj = self.cells[target]
+            table = [abs(i - ti) + abs(j - tj) for i, j in self.cells]
+            self.distances[target] = table
+        return table
+
+
+def board_geometry(rows, columns, cache_path = None):
+    """
+        Get the shared Geometry of a board size, building it only once per process.
+
+        :param rows: Number of rows in the board.
+        :param columns: Number of columns in the board.
+        :param cache_path: Optional pickle file to load the tables from, or to save them to
+                           when it does not exist yet.
+        :return: Geometry object.
+    """
+
+    key = (rows, columns)
+    if key not in _geometries:
+        geometry = None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                geometry = pickle.load(f)
+            if (geometry.rows, geometry.columns) != key:
+                geometry = None
+        if geometry is None:
+            geometry = Geometry(rows, columns)
+            if cache_path:
+                with open(cache_path, "wb") as f:
+                    pickle.dump(geometry, f)
+        _geometries[key] = geometry
+    return _geometries[key]
@@ -0,0 +1,186 @@
+moves = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+pathMap = {(1, 0): "down", (0, 1): "right", (-1, 0): "up", (0, -1): "left"}
+directionMap = {v: k for k, v in pathMap.items()}
+
+# Cycles already built, keyed by board size (rows, columns)
+_cycles = {}
+
+def build_cycle(rows, columns):
+    """
+        Build a closed tour of the board where consecutive cells are adjacent.
+
+        The tour goes right along row 0, zigzags down and up the remaining columns and
+        returns up column 0. A grid with both sides odd has an odd number of cells and no
+        Hamiltonian cycle, so there the last two columns are swept row by row and the
+        top-right cell is left out of the tour.
+
+        :param rows: Number of rows in the board (at least 2).
+        :param columns: Number of columns in the board (at least 2).
+        :return: List of tuples (row, col) in cycle order.
+    """
+
+    if columns % 2 and not rows % 2:
+        return [(i, j) for j, i in build_cycle(columns, rows)]
+
+    cycle = []
+    if columns % 2:
+        # Odd x odd: skip (0, columns - 1) and sweep the two last columns row by row
+        cycle += [(0, j) for j in range(columns - 1)]
+        for i in range(1, rows):
+            pair = [columns - 2, columns - 1] if i % 2 else [columns - 1, columns - 2]
+            cycle += [(i, j) for j in pair]
+        first = columns - 3
+        down = False
+    else:
+        cycle += [(0, j) for j in range(columns)]
+        first = columns - 1
+        down = True
+
+    for j in range(first, 0, -1):
+        span = range(1, rows) if down else range(rows - 1, 0, -1)
+        cycle += [(i, j) for i in span]
+        down = not down
+
+    cycle += [(i, 0) for i in range(rows - 1, 0, -1)]
+    return cycle
+
+
+class Hamiltonian:
+    def __init__(self, rows, columns, strict_fraction = 0.5):
+        """
+            Initialize the cycle strategy for a board, reusing the cycle of that board size if already built.
+
+            :param rows: Number of rows in the board.
+            :param columns: Number of columns in the board.
+            :param strict_fraction: Fraction of the tour the snake must cover to stop taking shortcuts.
+        """
+
+        self.rows = rows
+        self.columns = columns
+        self.strict_fraction = strict_fraction
+
+        if (rows, columns) not in _cycles:
+            cycle = build_cycle(rows, columns)
+            order = [-1] * (rows * columns)
+            for k, (i, j) in enumerate(cycle):
+                order[i * columns + j] = k
+            _cycles[(rows, columns)] = (cycle, order)
+        self.cycle, self.order = _cycles[(rows, columns)]
+        self.size = len(self.cycle)
+
+    def _position(self, pos):
+        """
+            Get the position of a cell in the cycle.
+
+            :param pos: Tuple (row, col) of the cell.
+            :return: Index in the cycle, or -1 if the cell is not part of it.
+        """
+
+        return self.order[pos[0] * self.columns + pos[1]]
+
+    def distance(self, a, b):
+        """
+            Count the moves needed to go from one cell to another following the cycle.
+
+            :param a: Tuple (row, col) of the start cell, on the cycle.
+            :param b: Tuple (row, col) of the end cell, on the cycle.
+            :return: Forward distance along the cycle.
+        """
+
+        return (self._position(b) - self._position(a)) % self.size
+
+    def isOrdered(self, snake):
+        """
+            Check that the body lies on the cycle between the tail and the head, in cycle order.
+
+            Under that condition nextMove never lets the head run into the body.
+
+            :param snake: Snake object representing the current snake state.
+            :return: True if the strategy can take over, False otherwise.
+        """
+
+        tail = snake.getTail()
+        if self._position(tail) < 0:
+            return False
+        last = -1
+        for k in range(snake.getLength() - 1, -1, -1):
+            cell = snake[k]
+            if self._position(cell) < 0:
+                return False
+            d = self.distance(tail, cell)
+            if d <= last:
+                return False
+            last = d
+        return True
+
+    def nextMove(self, snake, apple):
+        """
+            Decide the next move in O(1).
+
+            A short snake may jump ahead to any free neighbor that is still behind its tail
+            in cycle order, as long as it keeps a safety gap and does not skip past the
+            apple. A long snake follows the cycle strictly.
+
+            :param snake: Snake object representing the current snake state (body in cycle order).
+            :param apple: Tuple (row, col) of the apple's position, or None.
+            :return: Direction string, or None if the head is not on the cycle.
+        """
+
+        head = snake.getHead()
+        if self._position(head) < 0:
+            return None
+        nxt = self.cycle[(self._position(head) + 1) % self.size]
+        length = snake.getLength()
+
+        if length < self.strict_fraction * self.size:
+            to_tail = self.distance(head, snake.getTail())
+            gap = length // 4 + 2
+            to_apple = self.distance(head, apple) if apple and self._position(apple) >= 0 else 1
+            best = 1
+            for di, dj in moves:
+                cell = (head[0] + di, head[1] + dj)
+                if not (0 <= cell[0] < self.rows and 0 <= cell[1] < self.columns):
+                    continue
+                if self._position(cell) < 0 or snake.isOccupied(cell):
+                    continue
+                d = self.distance(head, cell)
+                if best < d <= to_apple and to_tail - d > gap:
+                    best, nxt = d, cell
+
+        return pathMap[(nxt[0] - head[0], nxt[1] - head[1])]
+
+    def path(self, snake, apple):
+        """
+            Plan the moves until the apple is eaten, following the cycle on a copy of the snake.
+
+            If the body is not in cycle order yet, the snake first follows the cycle strictly
+            until its whole body has been laid on it; the plan is dropped if a body segment
+            blocks the way before that.
+
+            :param snake: Snake object representing the current snake state.
+            :param apple: Tuple (row, col) of the apple's position.
+            :return: List of directions, empty if the cycle cannot be joined safely.
+        """
+
+        if self._position(snake.getHead()) < 0:
+            return []
+        copy = snake.copy()
+        unordered = 0 if self.isOrdered(snake) else snake.getLength()
+        directions = []
+        for _ in range(self.size + unordered):
+            head = copy.getHead()
+            if unordered:
+                nxt = self.cycle[(self._position(head) + 1) % self.size]
+                if copy.isOccupied(nxt):
+                    return []
+                move = pathMap[(nxt[0] - head[0], nxt[1] - head[1])]
+                unordered -= 1
+            else:
+                move = self.nextMove(copy, apple)
+            directions.append(move)
+            di, dj = directionMap[move]
+            cell = (head[0] + di, head[1] + dj)
+            copy.move(cell, cell == apple)
+            if cell == apple:
+                break
+        return directions
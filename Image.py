@@ -1,15 +1,19 @@
-from PIL import ImageGrab
+import numpy as np
+
+from Capture import MssCapture
 
 class Image:
-    def __init__(self, rows, columns, tileSize, top, left):
+    def __init__(self, rows, columns, tileSize, top, left, capture = None):
         """
             Initialize the image handler for capturing the game board.
 
             :param rows: Number of rows in the board.
             :param columns: Number of columns in the board.
-            :param tileSize: Size of each tile in pixels.
+            :param tileSize: Distance in pixels between the starts of consecutive tiles, possibly
+                             fractional (the board width divided by the number of columns).
             :param top: Y-coordinate of the top-left corner of the board.
             :param left: X-coordinate of the top-left corner of the board.
+            :param capture: Capture backend providing the frames, None to capture the screen with mss.
         """
 
         self.rows = rows
@@ -18,18 +22,24 @@ class Image:
         self.tileSize = tileSize
         self.top = top
         self.left = left
-        self.width = self.columns * self.tileSize + self.columns // 2
-        self.height = self.rows * self.tileSize + self.rows // 2
+        self.width = int(self.columns * self.tileSize)
+        self.height = int(self.rows * self.tileSize)
+
+        self.capture = capture or MssCapture(self.left, self.top, self.width, self.height)
+
+        # Pixel coordinates of every tile center, in row-major tile order
+        centers = [self.centralPixel(i, j) for i in range(self.rows) for j in range(self.columns)]
+        self.centerX = np.array([x for x, _ in centers])
+        self.centerY = np.array([y for _, y in centers])
 
     def takeBoardCapture(self):
         """
-            Capture the current board image as a PIL image.
+            Capture the current board image.
 
-            :return: Captured PIL image of the game board.
+            :return: NumPy array of the game board, in the capture backend's channel layout.
         """
 
-        boardBox = (self.left, self.top, self.left + self.width, self.top + self.height)
-        return ImageGrab.grab(bbox = boardBox)
+        return self.capture.grab()
 
     def centralPixel(self, i, j):
         """
@@ -40,7 +50,20 @@ class Image:
             :return: Tuple (x, y) representing the pixel coordinates.
         """
 
-        return (j * self.tileSize + j // 2 + self.tileSize // 2, i * self.tileSize + i // 2 + self.tileSize // 2)
+        half = int(self.tileSize) // 2
+        return (int(j * self.tileSize) + half, int(i * self.tileSize) + half)
+
+    def tileColors(self, board_image):
+        """
+            Sample the central pixel of every tile.
+
+            :param board_image: NumPy array of the game board.
+            :return: Tuple of three int arrays (red, green, blue), one entry per tile in row-major order.
+        """
+
+        pixels = board_image[self.centerY, self.centerX].astype(np.int16)
+        channels = self.capture.channels
+        return (pixels[:, channels.index("R")], pixels[:, channels.index("G")], pixels[:, channels.index("B")])
     
     def findApple(self):
         """
@@ -49,13 +72,27 @@ class Image:
             :return: Tuple (row, column) of the apple or None if not found.
         """
         
-        board_image = self.takeBoardCapture()
+        r, g, b = self.tileColors(self.takeBoardCapture())
+        found = np.flatnonzero((r > g) & (r > b))
+        if not len(found):
+            return None
+        return divmod(int(found[0]), self.columns)
+
+    def readBoard(self):
+        """
+            Read the whole board state from a single capture.
+
+            Every tile is classified in one vectorized pass over the tile centers: red
+            dominant for the apple, blue dominant for the snake, anything else is free.
+
+            :return: Tuple (apple, snake_cells): apple position or None, and the set of
+                     (row, column) tiles covered by the snake (head and body).
+        """
+
+        r, g, b = self.tileColors(self.takeBoardCapture())
+        apple = np.flatnonzero((r > g) & (r > b))
+        snake = np.flatnonzero((b > r) & (b > g))
 
-        for i in range(self.rows):
-            for j in range(self.columns):
-                r, g, b, a = board_image.getpixel(self.centralPixel(i, j))
+        apple = divmod(int(apple[0]), self.columns) if len(apple) else None
+        return apple, {divmod(int(k), self.columns) for k in snake}
 
-                if r > g and r > b:
-                    return (i, j)
-                    
-        return None
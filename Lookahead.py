@@ -0,0 +1,233 @@
+import math
+import random
+import time
+
+from simulation import Game
+from Strategies import PLANNERS, DEFAULT_PHASES
+
+class Node:
+    __slots__ = ("body", "actions", "visits", "totals", "children")
+
+    def __init__(self, body):
+        """
+            Initialize a search tree node: a board state with its apple known.
+
+            :param body: Tuple of the snake's segments in this state, used to check that a
+                         reused node matches the real game.
+        """
+
+        self.body = body
+        # Candidate paths from this state, filled on the first visit
+        self.actions = None
+        # Per action: number of playouts, sum of their rewards and apple -> child Node
+        self.visits = []
+        self.totals = []
+        self.children = []
+
+
+class LookaheadPlanner:
+    def __init__(self, agent, budget = 0.05, horizon = 3, exploration = 0.3, margin = 0.2, seed = None):
+        """
+            Initialize the anytime planner that picks among candidate paths by playing out sampled futures.
+
+            The search is a Monte Carlo tree over whole paths: a node is a board state, its
+            actions are the paths proposed by the default planners and fallbacks, and the
+            apple spawned after eating is sampled, each sampled apple leading to its own
+            child. Playouts past the tree use the default agent. The default agent's own
+            decision is played unless another path has a clearly better mean reward, which
+            in practice means the default one ran into a dead end in some sampled future.
+            The subtree of the apple that really spawns is kept for the next decision.
+
+            :param agent: Agent the planner belongs to (for the board size).
+            :param budget: Time per decision in seconds when no deadline is given.
+            :param horizon: Number of apples to eat in one playout.
+            :param exploration: UCB1 exploration constant.
+            :param margin: Mean reward another path needs above the default decision to replace it.
+            :param seed: Seed of the apple sampling, None for a random one.
+        """
+
+        self.policy = type(agent)(agent.rows, agent.columns, phases=DEFAULT_PHASES, deadline=None, params=agent.params)
+        self.rows = agent.rows
+        self.columns = agent.columns
+        self.budget = budget
+        self.horizon = horizon
+        # Moves after which a playout stops even if it has not eaten horizon apples
+        self.maxSteps = horizon * agent.rows * agent.columns // 4
+        self.exploration = exploration
+        self.margin = margin
+        self.rng = random.Random(seed)
+
+        # Children of the last played action, apple -> Node, candidates for the next root
+        self.pending = None
+        # Decisions that started from a kept subtree, and playouts of the last decision
+        self.reused = 0
+        self.playouts = 0
+
+    def _actions(self, snake, apple):
+        """
+            Get the distinct candidate paths of a state.
+
+            :param snake: Snake object of the state.
+            :param apple: Tuple (row, col) of the apple's position.
+            :return: List of paths (lists of directions), the default agent's decision first.
+        """
+
+        policy = self.policy
+        paths = [policy.compute(apple, snake)]
+        paths += [PLANNERS[name](policy, apple, snake, None)[0] for name in DEFAULT_PHASES[0][1]]
+        paths.append(policy.hamiltonian.path(snake, apple))
+        paths.append(policy._follow_tail(snake, apple))
+
+        actions, seen = [], set()
+        for path in paths:
+            if path and tuple(path) not in seen:
+                seen.add(tuple(path))
+                actions.append(path)
+        return actions
+
+    def _expand(self, node, game):
+        """
+            Fill the actions of a node reached for the first time.
+
+            :param node: Node to expand.
+            :param game: Game in the node's state.
+        """
+
+        node.actions = self._actions(game.snake, game.apple)
+        node.visits = [0] * len(node.actions)
+        node.totals = [0.0] * len(node.actions)
+        node.children = [{} for _ in node.actions]
+
+    def _select(self, node):
+        """
+            Pick the action to play out from a node with UCB1, trying every action once first.
+
+            :param node: Expanded Node.
+            :return: Index of the action.
+        """
+
+        total = sum(node.visits)
+        best, best_value = 0, -1.0
+        for a, n in enumerate(node.visits):
+            if n == 0:
+                return a
+            value = node.totals[a] / n + self.exploration * math.sqrt(math.log(total) / n)
+            if value > best_value:
+                best, best_value = a, value
+        return best
+
+    def _play(self, game, path):
+        """
+            Play a path in a game.
+
+            :param game: Game to advance.
+            :param path: List of directions.
+            :return: True if the snake is still alive at the end of the path.
+        """
+
+        for direction in path:
+            if not game.step(direction):
+                return False
+        return True
+
+    def _reward(self, alive, eaten, steps):
+        """
+            Score a playout: 0 if the snake died, otherwise between 0.5 and 1, higher when apples came faster.
+
+            :param alive: Whether the snake survived the playout.
+            :param eaten: Number of apples eaten.
+            :param steps: Number of moves made.
+            :return: Reward in [0, 1].
+        """
+
+        if not alive:
+            return 0.0
+        return 0.5 + 0.5 * eaten / (eaten + steps / (self.rows + self.columns) + 1e-9)
+
+    def _playout(self, root, game):
+        """
+            Run one playout from the root: descend the tree, add one node and finish with the default agent.
+
+            :param root: Root Node.
+            :param game: Copy of the root game, modified by the playout.
+        """
+
+        start_score, start_steps = game.score, game.steps
+        last_step = start_steps + self.maxSteps
+        node = root
+        visited = []
+        alive = True
+
+        def going():
+            return game.score - start_score < self.horizon and game.steps < last_step and game.apple is not None
+
+        while going():
+            if node.actions is None:
+                self._expand(node, game)
+            if not node.actions:
+                alive = False
+                break
+            a = self._select(node)
+            visited.append((node, a))
+            if not self._play(game, node.actions[a]):
+                alive = False
+                break
+            child = node.children[a].get(game.apple)
+            if child is None:
+                node.children[a][game.apple] = Node(tuple(game.snake))
+                break
+            node = child
+
+        while alive and going():
+            path = self.policy.compute(game.apple, game.snake)
+            if not path or not self._play(game, path):
+                alive = False
+
+        reward = self._reward(alive, game.score - start_score, game.steps - start_steps)
+        for node, a in visited:
+            node.visits[a] += 1
+            node.totals[a] += reward
+
+    def plan(self, apple, snake, limit = None):
+        """
+            Search until the deadline and return the path to play.
+
+            :param apple: Tuple (row, col) of the apple's position.
+            :param snake: Snake object representing the current snake state.
+            :param limit: SearchLimit of the call (see Strategies), whose deadline shortens the
+                          planner's budget and whose stop flag ends the search early; None for
+                          the budget alone.
+            :return: List of directions, empty if no candidate path exists.
+        """
+
+        start = time.perf_counter()
+        stop = start + self.budget
+        if limit is not None and limit.deadline is not None:
+            stop = min(limit.deadline, stop)
+
+        body = tuple(snake)
+        root = self.pending.get(apple) if self.pending else None
+        if root is not None and root.body == body:
+            self.reused += 1
+        else:
+            root = Node(body)
+
+        game = Game(self.rows, self.columns, self.rng, snake, apple)
+        if root.actions is None:
+            self._expand(root, game)
+        self.playouts = 0
+        if len(root.actions) < 2:
+            self.pending = None
+            return root.actions[0] if root.actions else []
+
+        while time.perf_counter() < stop and (limit is None or not limit.stop.is_set()):
+            self._playout(root, game.copy())
+            self.playouts += 1
+
+        # Keep the default decision unless another path did clearly better in the playouts
+        means = [t / n if n else 0.0 for t, n in zip(root.totals, root.visits)]
+        best = max(range(len(means)), key=lambda a: (means[a], root.visits[a]))
+        if not root.visits[0] or means[best] - means[0] < self.margin:
+            best = 0
+        self.pending = root.children[best]
+        return root.actions[best]
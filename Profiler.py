@@ -0,0 +1,75 @@
+import json
+
+class Profiler:
+    def __init__(self, path = None, slowMs = 100.0):
+        """
+            Initialize the per-decision profiler attached to an Agent (agent.profiler).
+
+            :param path: JSON lines file to append each decision to as soon as it is made,
+                         None to keep the decisions in memory (records).
+            :param slowMs: Decisions taking longer than this many milliseconds are flagged as slow.
+        """
+
+        self.slowMs = slowMs
+        self.records = []
+        self.context = {}
+        self.file = open(path, "a", buffering = 1) if path else None
+
+    def begin(self, length):
+        """
+            Start the record of a decision.
+
+            :param length: Length of the snake at decision time.
+            :return: Dictionary filled by the agent during the decision.
+        """
+
+        record = dict(self.context)
+        record.update({"length": length, "checks": {}, "ratio_calls": 0, "fallback": None})
+        return record
+
+    def end(self, record, path, seconds):
+        """
+            Close the record of a decision and store it.
+
+            :param record: Dictionary returned by begin.
+            :param path: List of directions returned by the decision.
+            :param seconds: Duration of the decision in seconds.
+        """
+
+        record["ms"] = seconds * 1000
+        record["moves"] = len(path)
+        record["slow"] = record["ms"] > self.slowMs
+
+        if self.file:
+            self.file.write(json.dumps(record) + "\n")
+        else:
+            self.records.append(record)
+
+    def slowDecisions(self):
+        """
+            Get the in-memory decisions that exceeded the slow threshold.
+
+            :return: List of decision records.
+        """
+
+        return [record for record in self.records if record["slow"]]
+
+    def export(self, path):
+        """
+            Append the in-memory decisions to a JSON lines file.
+
+            :param path: Output file path.
+        """
+
+        with open(path, "a") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def close(self):
+        """
+            Flush and close the output file, if any.
+        """
+
+        if self.file:
+            self.file.close()
+            self.file = None
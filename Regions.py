@@ -0,0 +1,97 @@
+import heapq
+
+class RegionMap:
+    def __init__(self, geometry, blockSize = 8):
+        """
+            Initialize the coarse view of a board: square blocks of cells, used to keep
+            searches and flood fills on large boards from touching every cell.
+
+            :param geometry: Geometry of the board (see Geometry.board_geometry).
+            :param blockSize: Side of a block in cells; blocks on the last row and column may be smaller.
+        """
+
+        self.geometry = geometry
+        self.blockSize = blockSize
+        self.blockRows = -(-geometry.rows // blockSize)
+        self.blockColumns = -(-geometry.columns // blockSize)
+        self.count = self.blockRows * self.blockColumns
+
+        # Flat cell index -> block index, and block index -> flat indices of its cells
+        self.blockOf = [(i // blockSize) * self.blockColumns + j // blockSize for i, j in geometry.cells]
+        self.blockCells = [[] for _ in range(self.count)]
+        for k, b in enumerate(self.blockOf):
+            self.blockCells[b].append(k)
+        self.blockSizes = [len(cells) for cells in self.blockCells]
+
+        # Block index -> list of (adjacent block, cells of that block touching this one)
+        self.adjacent = [{} for _ in range(self.count)]
+        for k, b in enumerate(self.blockOf):
+            for n in geometry.neighbors[k]:
+                nb = self.blockOf[n]
+                if nb != b:
+                    self.adjacent[b].setdefault(nb, []).append(n)
+        self.adjacent = [list(adjacent.items()) for adjacent in self.adjacent]
+
+        # Block index -> block indices within one block, diagonals included
+        self.around = []
+        for b in range(self.count):
+            bi, bj = divmod(b, self.blockColumns)
+            self.around.append([ni * self.blockColumns + nj
+                                for ni in range(max(0, bi - 1), min(self.blockRows, bi + 2))
+                                for nj in range(max(0, bj - 1), min(self.blockColumns, bj + 2))])
+
+    def occupancy(self, snake):
+        """
+            Count the body segments in every block.
+
+            :param snake: Snake object.
+            :return: List of counts indexed by block.
+        """
+
+        blockOf, columns = self.blockOf, self.geometry.columns
+        counts = [0] * self.count
+        for i, j in snake:
+            counts[blockOf[i * columns + j]] += 1
+        return counts
+
+    def corridor(self, snake, start, goal):
+        """
+            Get the blocks a search from start to goal should stay in.
+
+            A shortest route is searched over the blocks first, where crossing a block
+            costs more the more of it the body covers; the blocks along that route and
+            the blocks around them form the corridor.
+
+            :param snake: Snake object representing the current snake state.
+            :param start: Flat index of the start cell.
+            :param goal: Flat index of the goal cell.
+            :return: Bytearray with one entry per block, 1 for the blocks in the corridor.
+        """
+
+        counts = self.occupancy(snake)
+        sizes = self.blockSizes
+        source, target = self.blockOf[start], self.blockOf[goal]
+
+        cost = {source: 0.0}
+        parent = {source: -1}
+        heap = [(0.0, source)]
+        while heap:
+            c, b = heapq.heappop(heap)
+            if b == target:
+                break
+            if c > cost[b]:
+                continue
+            for nb, _ in self.adjacent[b]:
+                nc = c + 1 + 4 * counts[nb] / sizes[nb]
+                if nc < cost.get(nb, float("inf")):
+                    cost[nb] = nc
+                    parent[nb] = b
+                    heapq.heappush(heap, (nc, nb))
+
+        allowed = bytearray(self.count)
+        b = target
+        while b != -1:
+            for nb in self.around[b]:
+                allowed[nb] = 1
+            b = parent[b]
+        return allowed
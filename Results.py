@@ -0,0 +1,327 @@
+import csv
+import json
+import math
+import os
+import time
+
+class RunningStats:
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        """
+            Initialize the running count, mean, variance (Welford's method), minimum and maximum of a series.
+        """
+
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        """
+            Add one value.
+
+            :param x: Number to add.
+        """
+
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.min = x if self.min is None or x < self.min else self.min
+        self.max = x if self.max is None or x > self.max else self.max
+
+    def merge(self, other):
+        """
+            Add all the values summarized by another RunningStats.
+
+            :param other: RunningStats object.
+        """
+
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n = n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def std(self):
+        """
+            Get the sample standard deviation, as statistics.stdev.
+
+            :return: Standard deviation, 0.0 with fewer than two values.
+        """
+
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def toDict(self):
+        """
+            Get the state as a JSON-serializable dictionary.
+
+            :return: Dictionary accepted by fromDict.
+        """
+
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @staticmethod
+    def fromDict(data):
+        """
+            Rebuild a RunningStats saved with toDict.
+
+            :param data: Dictionary returned by toDict.
+            :return: RunningStats object.
+        """
+
+        stats = RunningStats()
+        stats.n, stats.mean, stats.m2, stats.min, stats.max = (data[k] for k in ("n", "mean", "m2", "min", "max"))
+        return stats
+
+
+class QuantileSketch:
+    def __init__(self, accuracy = 0.01):
+        """
+            Initialize a quantile sketch with bounded relative error.
+
+            Values are counted in logarithmic buckets whose bounds grow by a factor
+            (1 + accuracy) / (1 - accuracy), so any quantile is known within that relative
+            accuracy and the memory only depends on the range of the values, not on their number.
+
+            :param accuracy: Relative accuracy of the quantiles.
+        """
+
+        self.accuracy = accuracy
+        self.logGamma = math.log((1 + accuracy) / (1 - accuracy))
+        self.buckets = {}
+        self.zeros = 0
+        self.n = 0
+
+    def add(self, x):
+        """
+            Add one value.
+
+            :param x: Non-negative number to add.
+        """
+
+        self.n += 1
+        if x <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(x) / self.logGamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other):
+        """
+            Add all the values counted by another sketch of the same accuracy.
+
+            :param other: QuantileSketch object.
+        """
+
+        self.n += other.n
+        self.zeros += other.zeros
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q):
+        """
+            Get an approximate quantile.
+
+            :param q: Quantile in [0, 1].
+            :return: Value, None if the sketch is empty.
+        """
+
+        if not self.n:
+            return None
+        rank = q * (self.n - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * math.exp(key * self.logGamma) / (1 + math.exp(self.logGamma))
+        return 2 * math.exp(max(self.buckets) * self.logGamma) / (1 + math.exp(self.logGamma))
+
+    def toDict(self):
+        """
+            Get the state as a JSON-serializable dictionary.
+
+            :return: Dictionary accepted by fromDict.
+        """
+
+        return {"accuracy": self.accuracy, "zeros": self.zeros, "n": self.n,
+                "buckets": {str(key): count for key, count in self.buckets.items()}}
+
+    @staticmethod
+    def fromDict(data):
+        """
+            Rebuild a QuantileSketch saved with toDict.
+
+            :param data: Dictionary returned by toDict.
+            :return: QuantileSketch object.
+        """
+
+        sketch = QuantileSketch(data["accuracy"])
+        sketch.zeros, sketch.n = data["zeros"], data["n"]
+        sketch.buckets = {int(key): count for key, count in data["buckets"].items()}
+        return sketch
+
+
+class ResultsSink:
+    FIELDS = ("seed", "score", "steps", "time", "reached_limit")
+    QUANTILES = (0.1, 0.5, 0.9)
+
+    def __init__(self, path = None, progress = None, batchSize = 1000, progressEvery = 1000):
+        """
+            Initialize the collector of simulated game results.
+
+            Statistics are kept online (RunningStats and QuantileSketch), so memory does
+            not grow with the number of games. Per-game rows are appended to a CSV file
+            in batches and a JSON snapshot of the statistics is rewritten periodically,
+            both flushed on close, so an interrupted run keeps what it played.
+
+            :param path: CSV file receiving one row per game (appended to), None to keep no rows.
+            :param progress: JSON file receiving the statistics snapshots, None to write none.
+            :param batchSize: Number of rows buffered before they are written.
+            :param progressEvery: Number of games between progress snapshots.
+        """
+
+        self.path = path
+        self.progress = progress
+        self.batchSize = batchSize
+        self.progressEvery = progressEvery
+
+        self.scores = RunningStats()
+        self.times = RunningStats()
+        self.scoreSketch = QuantileSketch()
+        self.timeSketch = QuantileSketch()
+        self.reachedLimit = 0
+        self.rows = []
+        self.started = time.time()
+
+    def add(self, seed, score, steps, time_survived, reached_limit):
+        """
+            Add the result of one game.
+
+            :param seed: Seed of the game, None if unknown.
+            :param score: Final score.
+            :param steps: Number of moves made.
+            :param time_survived: Survival time in seconds.
+            :param reached_limit: Whether the game reached the time limit.
+        """
+
+        self.scores.add(score)
+        self.times.add(time_survived)
+        self.scoreSketch.add(score)
+        self.timeSketch.add(time_survived)
+        self.reachedLimit += bool(reached_limit)
+
+        if self.path:
+            self.rows.append((seed, score, steps, round(time_survived, 3), int(bool(reached_limit))))
+            if len(self.rows) >= self.batchSize:
+                self.flush()
+        if self.progress and self.scores.n % self.progressEvery == 0:
+            self.writeProgress()
+
+    def flush(self):
+        """
+            Append the buffered rows to the CSV file.
+        """
+
+        if not self.rows:
+            return
+        new = not os.path.exists(self.path) or not os.path.getsize(self.path)
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(self.FIELDS)
+            writer.writerows(self.rows)
+        self.rows = []
+
+    def summary(self):
+        """
+            Get the statistics collected so far.
+
+            :return: Dictionary with the number of games, score and time statistics and quantiles,
+                     percentage of games reaching the limit and elapsed wall time.
+        """
+
+        def describe(stats, sketch):
+            result = {"mean": stats.mean, "std": stats.std(), "min": stats.min, "max": stats.max}
+            # The sketch returns bucket midpoints: keep them within the observed range
+            result.update({f"p{int(q * 100)}": sketch.quantile(q) if not stats.n else
+                           min(max(sketch.quantile(q), stats.min), stats.max) for q in self.QUANTILES})
+            return result
+
+        n = self.scores.n
+        return {
+            "games": n,
+            "score": describe(self.scores, self.scoreSketch),
+            "time": describe(self.times, self.timeSketch),
+            "percent_reached_limit": self.reachedLimit / n * 100 if n else 0.0,
+            "elapsed_s": time.time() - self.started,
+        }
+
+    def state(self):
+        """
+            Get the statistics as a JSON-serializable dictionary, e.g. for a checkpoint.
+
+            :return: Dictionary accepted by restore.
+        """
+
+        return {
+            "scores": self.scores.toDict(),
+            "times": self.times.toDict(),
+            "score_sketch": self.scoreSketch.toDict(),
+            "time_sketch": self.timeSketch.toDict(),
+            "reached_limit": self.reachedLimit,
+        }
+
+    def restore(self, state):
+        """
+            Replace the statistics with a state saved by state.
+
+            :param state: Dictionary returned by state.
+        """
+
+        self.scores = RunningStats.fromDict(state["scores"])
+        self.times = RunningStats.fromDict(state["times"])
+        self.scoreSketch = QuantileSketch.fromDict(state["score_sketch"])
+        self.timeSketch = QuantileSketch.fromDict(state["time_sketch"])
+        self.reachedLimit = state["reached_limit"]
+
+    def merge(self, other):
+        """
+            Add the statistics of another sink (e.g. of another shard of the same run).
+
+            :param other: ResultsSink object.
+        """
+
+        self.scores.merge(other.scores)
+        self.times.merge(other.times)
+        self.scoreSketch.merge(other.scoreSketch)
+        self.timeSketch.merge(other.timeSketch)
+        self.reachedLimit += other.reachedLimit
+
+    def writeProgress(self):
+        """
+            Rewrite the progress snapshot, replacing the file atomically.
+        """
+
+        tmp = self.progress + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(tmp, self.progress)
+
+    def close(self):
+        """
+            Write the remaining rows and a final progress snapshot.
+        """
+
+        if self.path:
+            self.flush()
+        if self.progress:
+            self.writeProgress()
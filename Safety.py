@@ -0,0 +1,249 @@
+from collections import OrderedDict
+
+# Cell marks used while labeling the free space
+BLOCKED, REACHED, UNREACHED = 1, 2, 3
+
+class SafetyEvaluator:
+    def __init__(self, geometry, cacheSize = 1024, regions = None):
+        """
+            Initialize the evaluator that scores how safe the board is after following a path.
+
+            :param geometry: Geometry of the board (see Geometry.board_geometry).
+            :param cacheSize: Number of evaluated end states kept, oldest dropped first; 0 disables the cache.
+            :param regions: Optional Regions.RegionMap of the board: blocks the body does not
+                            touch are then filled as a whole instead of cell by cell.
+        """
+
+        self.geometry = geometry
+        self.regions = regions
+        self.cacheSize = cacheSize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def endBody(self, snake, path, apple):
+        """
+            Get the body the snake would have after following a path, without moving it.
+
+            The head visits the path cells in order, so the new body is those cells
+            (latest first) followed by the front of the current body. Only the cells
+            of the path and the kept segments are touched.
+
+            :param snake: Snake object representing the current snake state.
+            :param path: List of directions from the head.
+            :param apple: Tuple (row, col) of the apple's position; the snake grows by one if the path eats it.
+            :return: List of tuples representing the new body (head first).
+        """
+
+        geometry = self.geometry
+        k = geometry.index(snake.getHead())
+        heads = []
+        for step in path:
+            k = geometry.moveTable[step][k]
+            heads.append(geometry.cells[k])
+
+        length = snake.getLength() + (apple in heads)
+        heads.reverse()
+        body = heads[:length]
+        for k in range(length - len(body)):
+            body.append(snake[k])
+        return body
+
+    def _fill(self, mark, seed, value):
+        """
+            Flood fill the free cells connected to a seed cell.
+
+            :param mark: Bytearray with one entry per cell, 0 for cells not filled yet; filled cells are set to value.
+            :param seed: Flat index of a free cell to start from.
+            :param value: Non-zero value written to the filled cells.
+            :return: Number of cells filled.
+        """
+
+        neighbors = self.geometry.neighbors
+        mark[seed] = value
+        stack = [seed]
+        count = 1
+        while stack:
+            for n in neighbors[stack.pop()]:
+                if not mark[n]:
+                    mark[n] = value
+                    count += 1
+                    stack.append(n)
+        return count
+
+    def evaluate(self, body):
+        """
+            Measure the free space around a body.
+
+            The free cells are labeled in one pass: the cells reachable from the head are
+            filled first, then every remaining free cell seeds the fill of its component.
+
+            :param body: List of tuples representing the snake body (head first).
+            :return: Tuple (ratio, tailReachable, components): ratio of free cells reachable
+                     from the head (the head counted as reached) to all free cells, whether a
+                     cell next to the tail is reachable from the head, and the sizes of the
+                     free components, largest first.
+        """
+
+        key = tuple(body)
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+
+        if self.regions is not None:
+            result = self._evaluateRegions(body)
+        else:
+            result = self._evaluateCells(body)
+
+        if self.cacheSize:
+            cache[key] = result
+            if len(cache) > self.cacheSize:
+                cache.popitem(last=False)
+        return result
+
+    def _evaluateCells(self, body):
+        """
+            Cell by cell labeling of evaluate.
+
+            :param body: List of tuples representing the snake body (head first).
+            :return: Tuple (ratio, tailReachable, components), see evaluate.
+        """
+
+        geometry = self.geometry
+        neighbors = geometry.neighbors
+        columns = geometry.columns
+        mark = bytearray(geometry.size)
+        for i, j in body:
+            mark[i * columns + j] = BLOCKED
+
+        components = []
+        reached = 1
+        head = body[0][0] * columns + body[0][1]
+        for n in neighbors[head]:
+            if not mark[n]:
+                size = self._fill(mark, n, REACHED)
+                components.append(size)
+                reached += size
+
+        seed = mark.find(0)
+        while seed >= 0:
+            components.append(self._fill(mark, seed, UNREACHED))
+            seed = mark.find(0, seed + 1)
+
+        tail = body[-1][0] * columns + body[-1][1]
+        tail_reachable = tail in neighbors[head] or any(mark[n] == REACHED for n in neighbors[tail])
+        ratio = reached / max(1, geometry.size - len(body))
+        return ratio, tail_reachable, sorted(components, reverse=True)
+
+    def _fillRegions(self, mark, dirty, labels, seed, value):
+        """
+            Flood fill the free space connected to a seed cell over blocks and cells.
+
+            A block the body does not touch is entirely free and connected, so it is
+            labeled in one step; only the cells of the blocks holding body segments are
+            filled one by one.
+
+            :param mark: Bytearray of cell labels, read and written only in dirty blocks.
+            :param dirty: Bytearray with one entry per block, 1 for the blocks holding body segments.
+            :param labels: Bytearray of block labels for the other blocks.
+            :param seed: Flat index of a free, unlabeled cell.
+            :param value: Non-zero label written to the filled cells and blocks.
+            :return: Number of cells filled.
+        """
+
+        regions = self.regions
+        blockOf, adjacent, sizes = regions.blockOf, regions.adjacent, regions.blockSizes
+        neighbors = self.geometry.neighbors
+        count = 0
+        if dirty[blockOf[seed]]:
+            mark[seed] = value
+            count += 1
+        stack = [seed]
+        while stack:
+            k = stack.pop()
+            b = blockOf[k]
+            if dirty[b]:
+                for n in neighbors[k]:
+                    nb = blockOf[n]
+                    if dirty[nb]:
+                        if not mark[n]:
+                            mark[n] = value
+                            count += 1
+                            stack.append(n)
+                    elif not labels[nb]:
+                        stack.append(n)
+            elif not labels[b]:
+                labels[b] = value
+                count += sizes[b]
+                for nb, touching in adjacent[b]:
+                    if not dirty[nb]:
+                        if not labels[nb]:
+                            stack.append(touching[0])
+                        continue
+                    for n in touching:
+                        if not mark[n]:
+                            mark[n] = value
+                            count += 1
+                            stack.append(n)
+        return count
+
+    def _evaluateRegions(self, body):
+        """
+            Block-level labeling of evaluate, for large boards: its cost grows with the
+            number of blocks and the cells of the blocks the body covers, not the board size.
+
+            :param body: List of tuples representing the snake body (head first).
+            :return: Tuple (ratio, tailReachable, components), see evaluate.
+        """
+
+        geometry = self.geometry
+        regions = self.regions
+        blockOf = regions.blockOf
+        neighbors = geometry.neighbors
+        columns = geometry.columns
+        mark = bytearray(geometry.size)
+        dirty = bytearray(regions.count)
+        labels = bytearray(regions.count)
+        for i, j in body:
+            k = i * columns + j
+            mark[k] = BLOCKED
+            dirty[blockOf[k]] = 1
+
+        def label(k):
+            b = blockOf[k]
+            return mark[k] if dirty[b] else labels[b]
+
+        components = []
+        reached = 1
+        head = body[0][0] * columns + body[0][1]
+        for n in neighbors[head]:
+            if not label(n):
+                size = self._fillRegions(mark, dirty, labels, n, REACHED)
+                components.append(size)
+                reached += size
+
+        for b in range(regions.count):
+            if dirty[b]:
+                for k in regions.blockCells[b]:
+                    if not mark[k]:
+                        components.append(self._fillRegions(mark, dirty, labels, k, UNREACHED))
+            elif not labels[b]:
+                components.append(self._fillRegions(mark, dirty, labels, regions.blockCells[b][0], UNREACHED))
+
+        tail = body[-1][0] * columns + body[-1][1]
+        tail_reachable = tail in neighbors[head] or any(label(n) == REACHED for n in neighbors[tail])
+        ratio = reached / max(1, geometry.size - len(body))
+        return ratio, tail_reachable, sorted(components, reverse=True)
+
+    def reachableRatio(self, body):
+        """
+            Compute the ratio of reachable free cells from the head of a body.
+
+            :param body: List of tuples representing the snake body (head first).
+            :return: Ratio of reachable free cells to total free cells.
+        """
+
+        return self.evaluate(body)[0]
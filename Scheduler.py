@@ -0,0 +1,204 @@
+import collections
+import json
+import time
+
+class Scheduler:
+    def __init__(self, moveInterval, firstOffset = 0.030, spin = 0.002, bucket = 100):
+        """
+            Initialize the move scheduler that dispatches one move per game tick.
+
+            :param moveInterval: Expected time between moves in seconds.
+            :param firstOffset: Extra delay in seconds between the first and the second move: the
+                                fixed input-to-frame latency of the game, normally replaced by
+                                the value measured at game start (see setLatency).
+            :param spin: Time in seconds before each deadline spent busy-waiting instead of sleeping.
+            :param bucket: Width in microseconds of the dispatch error histogram buckets.
+        """
+
+        self.interval = int(moveInterval * 1e9)
+        self.firstOffset = int(firstOffset * 1e9)
+        self.spin = int(spin * 1e9)
+        self.bucket = bucket
+
+        self.deadline = None
+        self.lastTick = None
+        # Tick timestamps queued by observeTick (e.g. from a capture thread), applied by dispatch
+        self.ticks = collections.deque()
+        self.stalls = 0
+        self.histogram = {}
+        self.errors = 0
+        self.errorSum = 0
+        self.errorSquares = 0
+        self.worst = 0
+
+    def setLatency(self, latency):
+        """
+            Use a measured input latency as the delay between the first and the second move.
+
+            :param latency: Fixed part of the key-to-visible-move latency in seconds
+                            (see Environment.calibrateLatency).
+        """
+
+        self.firstOffset = int(latency * 1e9)
+
+    def phase(self):
+        """
+            Get the offset of the deadlines after the ticks seen on the board.
+
+            A key should reach the game half an interval before its next tick, as far as
+            possible from both ticks. A tick is seen about firstOffset after it happens
+            (the key's own transit is small next to capture and rendering), so the key is
+            sent half an interval minus firstOffset after the tick is seen.
+
+            :return: Offset in nanoseconds, in [0, interval).
+        """
+
+        return (self.interval // 2 - self.firstOffset) % self.interval
+
+    def nextSlot(self, timestamp):
+        """
+            Get the first deadline in phase with the last observed tick (see phase) not before a given time.
+
+            :param timestamp: Time in perf_counter_ns nanoseconds.
+            :return: Deadline in nanoseconds, timestamp itself if no tick was observed.
+        """
+
+        if self.lastTick is None:
+            return timestamp
+        anchor = self.lastTick + self.phase()
+        return anchor + -(-(timestamp - anchor) // self.interval) * self.interval
+
+    def waitUntil(self, deadline):
+        """
+            Block until the given time: sleep for most of the wait, then spin on the clock.
+
+            :param deadline: Target time in perf_counter_ns nanoseconds.
+            :return: Time at which the wait ended, in nanoseconds.
+        """
+
+        remaining = deadline - time.perf_counter_ns() - self.spin
+        if remaining > 0:
+            time.sleep(remaining / 1e9)
+        now = time.perf_counter_ns()
+        while now < deadline:
+            now = time.perf_counter_ns()
+        return now
+
+    def record(self, error):
+        """
+            Add one dispatch error to the statistics.
+
+            :param error: Dispatch time minus deadline, in nanoseconds.
+        """
+
+        key = int(error // (self.bucket * 1000))
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+        self.errors += 1
+        self.errorSum += error
+        self.errorSquares += error * error
+        self.worst = max(self.worst, abs(error))
+
+    def dispatch(self, send):
+        """
+            Call send on the next move deadline and measure how late it ran.
+
+            The first move sets the deadline grid; every later deadline is one interval
+            after the previous one, so errors do not accumulate. Without observed ticks the
+            first move is sent immediately and the second one interval plus firstOffset
+            later; with them it waits for the next deadline in phase with the ticks (see
+            observeTick). A move that arrives after its deadline (slow plan, stalled
+            capture) restarts the grid the same way, instead of every missed deadline
+            being sent back-to-back.
+
+            The ticks observed since the last call are applied first, so only the thread
+            calling dispatch ever changes the deadline grid.
+
+            :param send: Callable that sends the move to the game.
+        """
+
+        self.applyTicks()
+        now = time.perf_counter_ns()
+        if self.deadline is None and self.lastTick is None:
+            send()
+            self.deadline = time.perf_counter_ns() + self.interval + self.firstOffset
+            return
+
+        if self.deadline is None or self.deadline < now:
+            if self.deadline is not None:
+                self.stalls += 1
+            self.deadline = self.nextSlot(now)
+        start = self.waitUntil(self.deadline)
+        send()
+        self.record(start - self.deadline)
+        self.deadline += self.interval
+
+    def observeTick(self, timestamp):
+        """
+            Report a tick seen on the board (the snake entering a new tile). Safe to call from
+            another thread than dispatch: the tick is only queued, see applyTicks.
+
+            :param timestamp: Time at which the tick was seen, in perf_counter_ns nanoseconds.
+        """
+
+        self.ticks.append(timestamp)
+
+    def applyTicks(self):
+        """
+            Calibrate the move interval and the deadline grid against the queued ticks.
+
+            Gaps that are not close to one interval (missed frames, pauses) are ignored; the
+            others pull the interval towards the observed tick period.
+
+            The ticks also re-anchor the deadline grid: each one shifts the next deadline
+            by a quarter of its drift from the phase (see phase), left by interval errors.
+        """
+
+        while self.ticks:
+            timestamp = self.ticks.popleft()
+            if self.lastTick is not None:
+                gap = timestamp - self.lastTick
+                if abs(gap - self.interval) < self.interval // 4:
+                    self.interval += (gap - self.interval) // 32
+            self.lastTick = timestamp
+
+            if self.deadline is None:
+                continue
+            # Drift in [-interval / 2, interval / 2)
+            half = self.interval // 2
+            drift = (self.deadline - timestamp - self.phase() + half) % self.interval - half
+            self.deadline -= drift // 4
+
+    def summary(self):
+        """
+            Summarize the dispatch errors measured so far.
+
+            :return: Dictionary with the number of moves, mean, standard deviation and worst
+                     absolute error in microseconds, the number of stalls (moves that arrived
+                     after their deadline), the calibrated interval, first move offset and
+                     tick phase in seconds and the histogram as {bucket start in microseconds: count}.
+        """
+
+        n = max(1, self.errors)
+        mean = self.errorSum / n
+        std = max(0.0, self.errorSquares / n - mean * mean) ** 0.5
+        return {
+            "moves": self.errors,
+            "mean_us": mean / 1000,
+            "std_us": std / 1000,
+            "worst_us": self.worst / 1000,
+            "stalls": self.stalls,
+            "interval_s": self.interval / 1e9,
+            "first_offset_s": self.firstOffset / 1e9,
+            "phase_s": self.phase() / 1e9,
+            "histogram_us": {key * self.bucket: count for key, count in sorted(self.histogram.items())},
+        }
+
+    def exportHistogram(self, path):
+        """
+            Write the timing summary to a JSON file.
+
+            :param path: Output file path.
+        """
+
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
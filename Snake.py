@@ -1,14 +1,72 @@
-from collections import deque
+from config import ROWS, COLUMNS
+from Geometry import board_geometry
 
 class Snake:
-    def __init__(self, body = [(7, 4), (7, 3), (7, 2), (7, 1)]):
+    __slots__ = ("rows", "columns", "capacity", "cells", "start", "length", "clock", "grid", "geometry", "zobrist")
+
+    def __init__(self, body = None, rows = ROWS, columns = COLUMNS):
         """
             Initialize the snake with its initial body.
 
-            :param body: List of tuples representing the snake's segments (head first).
+            The segments live in a ring buffer with one slot per board cell: the head is
+            at cells[start] and the k-th segment at cells[(start + k) % capacity], so a
+            move only writes one slot. The snake can be read without copies through
+            len(snake), snake[k], iteration (head first) and `pos in snake`.
+
+            The snake also keeps a flat occupancy grid with one entry per board cell,
+            holding the move counter at which the head last entered that cell. A cell
+            whose stamp is within the last len(body) moves is part of the body, and the
+            stamp directly gives how many moves remain until that segment vacates.
+
+            The ordered body is summarized by a Zobrist hash (zobrist): the keys of the
+            head cell, the tail cell and every link between consecutive segments XORed
+            together, so a move only swaps the keys at both ends.
+
+            :param body: List of tuples representing the snake's segments (head first), None for the
+                         start position of the board (see Geometry.start_body).
+            :param rows: Number of rows in the board.
+            :param columns: Number of columns in the board.
         """
-        
-        self.body = deque(body)
+
+        self.geometry = board_geometry(rows, columns)
+        if body is None:
+            body = self.geometry.startBody
+
+        self.rows = rows
+        self.columns = columns
+        self.capacity = rows * columns
+        self.cells = [None] * self.capacity
+        self.cells[:len(body)] = [tuple(cell) for cell in body]
+        self.start = 0
+        self.length = len(body)
+
+        self.clock = self.length - 1
+        self.grid = [-1] * self.capacity
+        for k, (i, j) in enumerate(body):
+            self.grid[i * columns + j] = self.clock - k
+
+        indices = [i * columns + j for i, j in body]
+        self.zobrist = self.geometry.zobristHead[indices[0]] ^ self.geometry.zobristTail[indices[-1]]
+        for a, b in zip(indices, indices[1:]):
+            self.zobrist ^= self.geometry.linkKey(a, b)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.length
+        if not 0 <= k < self.length:
+            raise IndexError("snake segment out of range")
+        return self.cells[(self.start + k) % self.capacity]
+
+    def __iter__(self):
+        cells, capacity = self.cells, self.capacity
+        for k in range(self.start, self.start + self.length):
+            yield cells[k % capacity]
+
+    def __contains__(self, pos):
+        return 0 <= pos[0] < self.rows and 0 <= pos[1] < self.columns and self.isOccupied(pos)
 
     def getHead(self):
         """
@@ -16,17 +74,78 @@ class Snake:
 
             :return: Tuple (row, column) of the head.
         """
-        
-        return self.body[0]
-    
+
+        return self.cells[self.start]
+
+    def getTail(self):
+        """
+            Get the current tail position.
+
+            :return: Tuple (row, column) of the tail.
+        """
+
+        return self.cells[(self.start + self.length - 1) % self.capacity]
+
     def getBody(self):
         """
-            Get the full snake body.
+            Get a copy of the full snake body. Prefer iterating the snake itself in hot loops.
 
             :return: List of tuples representing the body segments.
         """
 
-        return list(self.body) 
+        end = self.start + self.length
+        if end <= self.capacity:
+            return self.cells[self.start:end]
+        return self.cells[self.start:] + self.cells[:end - self.capacity]
+
+    def getLength(self):
+        """
+            Get the number of segments of the snake.
+
+            :return: Length of the snake.
+        """
+
+        return self.length
+
+    def freeAfter(self, pos):
+        """
+            Get the number of moves (without growing) until a cell is no longer covered by the body.
+
+            :param pos: Tuple (row, column) of a cell inside the board.
+            :return: 0 if the cell is free, len(body) for the head, len(body) - k for the k-th segment.
+        """
+
+        return max(0, self.grid[pos[0] * self.columns + pos[1]] - self.clock + self.length)
+
+    def freeAfterIndex(self, k):
+        """
+            Same as freeAfter, for a cell given by its flat index row * columns + column.
+
+            :param k: Flat index of a cell inside the board.
+            :return: Number of moves until the cell is free.
+        """
+
+        return max(0, self.grid[k] - self.clock + self.length)
+
+    def isOccupiedIndex(self, k):
+        """
+            Same as isOccupied, for a cell given by its flat index row * columns + column.
+
+            :param k: Flat index of a cell inside the board.
+            :return: True if a body segment is on the cell, False otherwise.
+        """
+
+        return self.grid[k] > self.clock - self.length
+
+    def isOccupied(self, pos):
+        """
+            Check if a cell inside the board is currently covered by the body.
+
+            :param pos: Tuple (row, column) of a cell inside the board.
+            :return: True if a body segment is on the cell, False otherwise.
+        """
+
+        return self.grid[pos[0] * self.columns + pos[1]] > self.clock - self.length
 
     def move(self, next_position, grow = False):
         """
@@ -36,7 +155,57 @@ class Snake:
             :param grow: Boolean, if True the snake grows; otherwise, the tail moves.
         """
 
-        self.body.appendleft(next_position)
+        cells, columns, geometry = self.cells, self.columns, self.geometry
+        oldHead = cells[self.start]
+        self.start = (self.start - 1) % self.capacity
+        cells[self.start] = next_position
+        self.clock += 1
+        a = next_position[0] * columns + next_position[1]
+        self.grid[a] = self.clock
+
+        b = oldHead[0] * columns + oldHead[1]
+        key = self.zobrist ^ geometry.zobristHead[b] ^ geometry.zobristHead[a] ^ geometry.linkKey(a, b)
+        if grow:
+            self.length += 1
+        else:
+            end = self.start + self.length
+            oldTail, newTail = cells[end % self.capacity], cells[(end - 1) % self.capacity]
+            t = oldTail[0] * columns + oldTail[1]
+            u = newTail[0] * columns + newTail[1]
+            key ^= geometry.zobristTail[t] ^ geometry.zobristTail[u] ^ geometry.linkKey(u, t)
+        self.zobrist = key
+
+    def snapshot(self):
+        """
+            Save the current state, e.g. before a lookahead that moves the snake.
+
+            :return: Opaque state to pass to restore.
+        """
+
+        return (self.start, self.length, self.clock, self.zobrist, self.cells[:], self.grid[:])
+
+    def restore(self, state):
+        """
+            Go back to a state saved by snapshot.
+
+            :param state: Value returned by snapshot on this snake.
+        """
+
+        self.start, self.length, self.clock, self.zobrist, cells, grid = state
+        self.cells[:] = cells
+        self.grid[:] = grid
+
+    def copy(self):
+        """
+            Get an independent snake in the same state.
+
+            :return: Snake object.
+        """
 
-        if not grow:
-            self.body.pop()
\ No newline at end of file
+        other = Snake.__new__(Snake)
+        other.rows, other.columns, other.capacity = self.rows, self.columns, self.capacity
+        other.start, other.length, other.clock = self.start, self.length, self.clock
+        other.geometry, other.zobrist = self.geometry, self.zobrist
+        other.cells = self.cells[:]
+        other.grid = self.grid[:]
+        return other
@@ -0,0 +1,212 @@
+import threading
+import time
+
+# Path planners by name: planner(agent, apple, snake, limit) -> (path, length).
+# limit is the SearchLimit of the call, or None; a planner adds the cells it searched to
+# limit.expanded, and one that can take long checks limit.expired() and returns its best
+# path so far. Planners may run concurrently on one agent (see Agent.deadline), so any
+# other state of a call must stay out of the agent.
+PLANNERS = {}
+
+# Candidate scorers by name: scorer(agent, path, length, ratio) -> score, the highest wins.
+# ratio is the reachable free space after the path (see Safety.SafetyEvaluator).
+SCORERS = {}
+
+# Default phases: (minimum snake length, planner names, scorer name). config.STRATEGY_PHASES
+# starts from them, and the lookahead's playout policy always uses them.
+DEFAULT_PHASES = [(0, ("bfs", "bfs_body", "a_star"), "balanced")]
+
+
+class SearchLimit:
+    def __init__(self, deadline = None):
+        """
+            Initialize the state of one planner call.
+
+            :param deadline: perf_counter time the decision must be made by, None for no limit.
+        """
+
+        self.deadline = deadline
+        # Set to ask the planner to give up, e.g. once its decision has been made without it
+        self.stop = threading.Event()
+        # Number of cells discovered by the searches of the call
+        self.expanded = 0
+
+    def expired(self):
+        """
+            Check whether the planner should stop searching.
+
+            :return: True if stop is set or the deadline has passed.
+        """
+
+        return self.stop.is_set() or (self.deadline is not None and time.perf_counter() >= self.deadline)
+
+
+class AgentParams:
+    FIELDS = ("threshold_base", "threshold_fill", "ratio_weight", "length_weight", "order")
+
+    def __init__(self, threshold_base = 0.4, threshold_fill = 0.4, ratio_weight = 0.5, length_weight = 0.5,
+                 order = None):
+        """
+            Initialize the tunable constants of Agent decisions (see Tuning.py).
+
+            A candidate path is kept when the free space reachable after it is at least
+            threshold_base + threshold_fill * (snake length / board cells), and the
+            "balanced" scorer ranks the kept ones by
+            ratio_weight * reachable ratio + length_weight * (1 - path length / board cells).
+
+            :param threshold_base: Reachable ratio required from an empty board.
+            :param threshold_fill: Increase of the required ratio as the snake fills the board.
+            :param ratio_weight: Weight of the reachable ratio in the balanced score.
+            :param length_weight: Weight of the path shortness in the balanced score.
+            :param order: Planner names in the order candidates are computed and ties are
+                          broken, planners not listed coming after; None for the phase order.
+        """
+
+        self.threshold_base = threshold_base
+        self.threshold_fill = threshold_fill
+        self.ratio_weight = ratio_weight
+        self.length_weight = length_weight
+        self.order = tuple(order) if order is not None else None
+
+    def threshold(self, length, cells):
+        """
+            Get the reachable ratio a candidate path must leave.
+
+            :param length: Length of the snake.
+            :param cells: Number of cells of the board.
+            :return: Minimum reachable ratio.
+        """
+
+        return self.threshold_base + self.threshold_fill * (length / cells)
+
+    def sort(self, planners):
+        """
+            Order the planners of a phase.
+
+            :param planners: List of planner names.
+            :return: List of the same names, those in order first.
+        """
+
+        if self.order is None:
+            return planners
+        rank = {name: k for k, name in enumerate(self.order)}
+        return sorted(planners, key=lambda name: rank.get(name, len(rank)))
+
+    def toDict(self):
+        """
+            Get the parameters as a JSON-serializable dictionary.
+
+            :return: Dictionary accepted by fromDict and by Agent's params argument.
+        """
+
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        if self.order is not None:
+            data["order"] = list(self.order)
+        return data
+
+    @staticmethod
+    def fromDict(data):
+        """
+            Build parameters from a dictionary, missing entries taking their default.
+
+            :param data: Dictionary with some of the FIELDS.
+            :return: AgentParams object.
+        """
+
+        unknown = set(data) - set(AgentParams.FIELDS)
+        if unknown:
+            raise KeyError(f"unknown agent parameters {sorted(unknown)}")
+        return AgentParams(**data)
+
+    def __repr__(self):
+        return f"AgentParams({', '.join(f'{k}={v!r}' for k, v in self.toDict().items())})"
+
+
+def register_planner(name):
+    """
+        Decorator adding a path planner to the registry.
+
+        :param name: Name used to select the planner in the strategy phases.
+        :return: Decorator returning the function unchanged.
+    """
+
+    def decorator(planner):
+        PLANNERS[name] = planner
+        return planner
+    return decorator
+
+
+def register_scorer(name):
+    """
+        Decorator adding a candidate scorer to the registry.
+
+        :param name: Name used to select the scorer in the strategy phases.
+        :return: Decorator returning the function unchanged.
+    """
+
+    def decorator(scorer):
+        SCORERS[name] = scorer
+        return scorer
+    return decorator
+
+
+def phase_strategies(phases, length):
+    """
+        Select the planners and scorer of the game phase a snake is in.
+
+        :param phases: List of (minimum snake length, planner names, scorer name), sorted by length.
+        :param length: Length of the snake.
+        :return: Tuple (list of planner names, scorer name) of the last phase the length reaches.
+    """
+
+    planners, scorer = phases[0][1], phases[0][2]
+    for min_length, names, scorer_name in phases:
+        if length >= min_length:
+            planners, scorer = names, scorer_name
+    for name in planners:
+        if name not in PLANNERS:
+            raise KeyError(f"unknown planner {name!r}")
+    if scorer not in SCORERS:
+        raise KeyError(f"unknown scorer {scorer!r}")
+    return list(planners), scorer
+
+
+@register_planner("bfs")
+def bfs(agent, apple, snake, limit):
+    return agent._find_path(apple, snake, use_body_hugging=False, limit=limit)
+
+
+@register_planner("bfs_body")
+def bfs_body(agent, apple, snake, limit):
+    return agent._find_path(apple, snake, use_body_hugging=True, limit=limit)
+
+
+@register_planner("a_star")
+def a_star(agent, apple, snake, limit):
+    return agent._a_star(apple, snake, limit)
+
+
+@register_planner("lookahead")
+def lookahead(agent, apple, snake, limit):
+    if agent.lookahead is None:
+        # Imported here: the lookahead plays out futures with simulation.Game, which imports Agent
+        from Lookahead import LookaheadPlanner
+        agent.lookahead = LookaheadPlanner(agent)
+    path = agent.lookahead.plan(apple, snake, limit)
+    return path, len(path)
+
+
+@register_scorer("balanced")
+def balanced(agent, path, length, ratio):
+    norm_len = length / (agent.rows * agent.columns)
+    return agent.params.ratio_weight * ratio + agent.params.length_weight * (1 - norm_len)
+
+
+@register_scorer("safest")
+def safest(agent, path, length, ratio):
+    return ratio
+
+
+@register_scorer("shortest")
+def shortest(agent, path, length, ratio):
+    return -length
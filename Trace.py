@@ -0,0 +1,393 @@
+import argparse
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from Snake import Snake
+from Geometry import board_geometry, pathMap
+
+# Trace layout: a header, then a stream of records. A move is a single byte holding its
+# direction code and a grow bit; every other record starts with a tag byte above them.
+MAGIC = b"SNKT"
+VERSION = 2
+# magic, version, seed flags, rows, columns, absolute value of the seed, snapshot interval
+HEADER = struct.Struct("<4sBBHHQH")
+SEED_SET = 0x01       # the header holds a seed
+SEED_NEGATIVE = 0x02  # the seed is negative
+
+DIRECTIONS = list(pathMap.values())
+CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+GROW = 0x04
+
+APPLE = 0x10     # u16 apple cell (NO_CELL: none)
+DECISION = 0x20  # u16 path length, f32 decision time in milliseconds
+SNAPSHOT = 0x30  # u32 step, u16 body length, u16 cells (head first), u16 apple cell
+END = 0x40       # u8 alive, u32 score
+
+NO_CELL = 0xFFFF
+APPLE_RECORD = struct.Struct("<BH")
+DECISION_RECORD = struct.Struct("<BHf")
+SNAPSHOT_RECORD = struct.Struct("<BIH")
+END_RECORD = struct.Struct("<BBI")
+RECORDS = {APPLE: APPLE_RECORD, DECISION: DECISION_RECORD, SNAPSHOT: SNAPSHOT_RECORD, END: END_RECORD}
+
+
+def index_path(path):
+    """
+        Get the snapshot index file of a trace.
+
+        :param path: Trace file path.
+        :return: Index file path.
+    """
+
+    return path + ".idx"
+
+
+class TraceWriter:
+    def __init__(self, path, rows, columns, seed = None, snapshotEvery = 64, bufferSize = 1 << 16):
+        """
+            Initialize the recorder of one game: moves, apple spawns and decision timings.
+
+            Records go through a buffered file, so recording a move is a one-byte write.
+            The writer replays the moves on its own snake to write a full snapshot every
+            snapshotEvery moves; their offsets are saved next to the trace on close, so a
+            reader can jump to any step. Records may come from several threads.
+
+            :param path: Output trace file.
+            :param rows: Number of rows in the board.
+            :param columns: Number of columns in the board.
+            :param seed: Seed of the game's random generator, None if unknown.
+            :param snapshotEvery: Number of moves between snapshots.
+            :param bufferSize: Size in bytes of the write buffer.
+        """
+
+        self.path = path
+        self.geometry = board_geometry(rows, columns)
+        self.snapshotEvery = snapshotEvery
+        flags = 0
+        if seed is not None:
+            if abs(seed) >= 1 << 64:
+                raise ValueError(f"trace seeds must fit in 64 bits, got {seed}")
+            flags = SEED_SET | (SEED_NEGATIVE if seed < 0 else 0)
+        self.file = open(path, "wb", buffering=bufferSize)
+        self.file.write(HEADER.pack(MAGIC, VERSION, flags, rows, columns, abs(seed or 0), snapshotEvery))
+        self.lock = threading.Lock()
+
+        self.snake = None
+        self.apple = None
+        self.steps = 0
+        self.offsets = array("Q")
+
+    def _cell(self, pos):
+        return NO_CELL if pos is None else self.geometry.index(pos)
+
+    def _writeSnapshot(self):
+        body = [self.geometry.index(cell) for cell in self.snake]
+        self.file.write(SNAPSHOT_RECORD.pack(SNAPSHOT, self.steps, len(body)))
+        self.file.write(array("H", body + [self._cell(self.apple)]).tobytes())
+
+    def start(self, snake, apple):
+        """
+            Record the initial state of the game.
+
+            :param snake: Snake object at the start of the game.
+            :param apple: Tuple (row, col) of the first apple, None if not known yet.
+        """
+
+        with self.lock:
+            self.snake = snake.copy()
+            self.apple = apple
+            self.offsets.append(self.file.tell())
+            self._writeSnapshot()
+
+    def resync(self, snake, apple):
+        """
+            Record a state that does not follow from the moves (e.g. the live snake corrected from the screen).
+
+            :param snake: Snake object in its new state.
+            :param apple: Tuple (row, col) of the apple's position, None if not known.
+        """
+
+        with self.lock:
+            self.snake = snake.copy()
+            self.apple = apple
+            self._writeSnapshot()
+
+    def move(self, direction, apple):
+        """
+            Record a move.
+
+            :param direction: String ('up', 'down', 'left', 'right') of the move.
+            :param apple: Tuple (row, col) of the apple on the board when the move was made;
+                          the snake grows if the move reaches it.
+        """
+
+        with self.lock:
+            if apple != self.apple:
+                self.apple = apple
+                self.file.write(APPLE_RECORD.pack(APPLE, self._cell(apple)))
+
+            geometry = self.geometry
+            newHead = geometry.cells[geometry.moveTable[direction][geometry.index(self.snake.getHead())]]
+            grew = newHead == apple
+            self.snake.move(newHead, grew)
+            self.steps += 1
+            self.file.write(bytes((CODES[direction] | (GROW if grew else 0),)))
+            if grew:
+                self.apple = None
+
+            if self.steps % self.snapshotEvery == 0:
+                self.offsets.append(self.file.tell())
+                self._writeSnapshot()
+
+    def decision(self, length, seconds):
+        """
+            Record the duration of an agent decision, placed at the current step.
+
+            :param length: Number of moves in the decided path.
+            :param seconds: Duration of the decision in seconds.
+        """
+
+        with self.lock:
+            self.file.write(DECISION_RECORD.pack(DECISION, min(length, 0xFFFF), seconds * 1000))
+
+    def end(self, alive, score):
+        """
+            Record the end of the game.
+
+            :param alive: Whether the snake was still alive (e.g. the time limit was reached).
+            :param score: Final score.
+        """
+
+        with self.lock:
+            self.file.write(END_RECORD.pack(END, int(alive), score))
+
+    def close(self):
+        """
+            Flush the trace and write its snapshot index.
+        """
+
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+            with open(index_path(self.path), "wb") as f:
+                self.offsets.tofile(f)
+
+
+class TraceReader:
+    def __init__(self, path):
+        """
+            Open a trace for random access.
+
+            The trace and its snapshot index are memory-mapped, so opening is cheap and a
+            step is rebuilt from the snapshot before it plus at most snapshotEvery moves.
+            Without an index file (e.g. a trace cut short by a crash) the snapshots are
+            found with one scan.
+
+            :param path: Trace file path.
+        """
+
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, rows, columns, seed, every = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} trace")
+        seed = None if not flags & SEED_SET else -seed if flags & SEED_NEGATIVE else seed
+
+        self.rows = rows
+        self.columns = columns
+        self.seed = seed
+        self.snapshotEvery = every
+        self.geometry = board_geometry(rows, columns)
+
+        self.indexData = None
+        if os.path.exists(index_path(path)) and os.path.getsize(index_path(path)):
+            with open(index_path(path), "rb") as f:
+                self.indexData = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.offsets = memoryview(self.indexData).cast("Q")
+        else:
+            found = {}
+            for offset, tag, value in self._records(HEADER.size):
+                if tag == SNAPSHOT and value[1] % every == 0:
+                    found.setdefault(value[1] // every, offset)
+            self.offsets = [found[k] for k in sorted(found)]
+
+    def _records(self, offset):
+        """
+            Walk the records from an offset.
+
+            :param offset: Offset of a record in the trace.
+            :return: Generator of (offset, tag, value): value is the direction code and grow
+                     bit of a move, the record tuple otherwise. Stops at a truncated record.
+        """
+
+        data = self.data
+        size = len(data)
+        while offset < size:
+            tag = data[offset]
+            if tag < APPLE:
+                yield offset, tag, tag
+                offset += 1
+                continue
+
+            kind = tag & 0xF0
+            record = RECORDS.get(kind)
+            if record is None or offset + record.size > size:
+                return
+            value = record.unpack_from(data, offset)
+            length = record.size
+            if kind == SNAPSHOT:
+                length += 2 * (value[2] + 1)
+                if offset + length > size:
+                    return
+            yield offset, kind, value
+            offset += length
+
+    def _loadSnapshot(self, offset):
+        """
+            Decode a snapshot record.
+
+            :param offset: Offset of the snapshot record.
+            :return: Tuple (step, Snake, apple).
+        """
+
+        _, step, length = SNAPSHOT_RECORD.unpack_from(self.data, offset)
+        start = offset + SNAPSHOT_RECORD.size
+        cells = memoryview(self.data)[start:start + 2 * (length + 1)].cast("H")
+        cellsOf = self.geometry.cells
+        body = [cellsOf[k] for k in cells[:length]]
+        apple = None if cells[length] == NO_CELL else cellsOf[cells[length]]
+        cells.release()
+        return step, Snake(body, self.rows, self.columns), apple
+
+    def state(self, step):
+        """
+            Rebuild the game at a step.
+
+            :param step: Number of moves made (0 for the initial state).
+            :return: Tuple (Snake, apple) after that many moves, the apple being the one on
+                     the board before the next move (None if not known).
+        """
+
+        start = self.offsets[min(step // self.snapshotEvery, len(self.offsets) - 1)]
+        current, snake, apple = self._loadSnapshot(start)
+        if current > step:
+            raise IndexError(f"step {step} is before the first snapshot")
+
+        geometry = self.geometry
+        for offset, tag, value in self._records(start):
+            if tag < APPLE:
+                if current == step:
+                    break
+                newHead = geometry.cells[geometry.moveTable[DIRECTIONS[value & 3]][geometry.index(snake.getHead())]]
+                snake.move(newHead, bool(value & GROW))
+                if value & GROW:
+                    apple = None
+                current += 1
+            elif tag == APPLE:
+                apple = None if value[1] == NO_CELL else geometry.cells[value[1]]
+            elif tag == SNAPSHOT and offset != start:
+                current, snake, apple = self._loadSnapshot(offset)
+            elif tag == END:
+                break
+
+        if current != step:
+            raise IndexError(f"step {step} is past the end of the trace ({current} moves)")
+        return snake, apple
+
+    def moves(self):
+        """
+            Get the recorded moves.
+
+            :return: List of (direction, grew) tuples in order.
+        """
+
+        return [(DIRECTIONS[value & 3], bool(value & GROW)) for _, tag, value in self._records(HEADER.size) if tag < APPLE]
+
+    def decisions(self):
+        """
+            Get the recorded decisions.
+
+            :return: List of (step, path length, milliseconds) tuples.
+        """
+
+        step = 0
+        decisions = []
+        for _, tag, value in self._records(HEADER.size):
+            if tag < APPLE:
+                step += 1
+            elif tag == DECISION:
+                decisions.append((step, value[1], value[2]))
+        return decisions
+
+    def summary(self):
+        """
+            Summarize the game.
+
+            :return: Dictionary with the seed, number of moves, apples eaten, decisions and
+                     the end of the game (alive, score), None for the end if it was not recorded.
+        """
+
+        steps = apples = decisions = 0
+        end = None
+        for _, tag, value in self._records(HEADER.size):
+            if tag < APPLE:
+                steps += 1
+                apples += bool(value & GROW)
+            elif tag == DECISION:
+                decisions += 1
+            elif tag == END:
+                end = {"alive": bool(value[1]), "score": value[2]}
+        return {"seed": self.seed, "steps": steps, "apples": apples, "decisions": decisions, "end": end}
+
+    def close(self):
+        """
+            Release the memory maps.
+        """
+
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        if self.indexData is not None:
+            self.indexData.close()
+        self.data.close()
+
+
+def render(snake, apple, rows, columns):
+    """
+        Draw a board as text: 'H' head, 'o' body, 'A' apple, '.' free.
+
+        :param snake: Snake object.
+        :param apple: Tuple (row, col) of the apple, or None.
+        :param rows: Number of rows in the board.
+        :param columns: Number of columns in the board.
+        :return: Multi-line string.
+    """
+
+    grid = [["."] * columns for _ in range(rows)]
+    if apple is not None:
+        grid[apple[0]][apple[1]] = "A"
+    for k, (i, j) in enumerate(snake):
+        grid[i][j] = "H" if k == 0 else "o"
+    return "\n".join("".join(row) for row in grid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect a recorded game trace.")
+    parser.add_argument("trace", help="trace file written by TraceWriter")
+    parser.add_argument("--step", type=int, help="draw the board after this many moves (negative: from the end)")
+    args = parser.parse_args()
+
+    reader = TraceReader(args.trace)
+    summary = reader.summary()
+    print(summary)
+    if args.step is not None:
+        step = args.step if args.step >= 0 else summary["steps"] + 1 + args.step
+        snake, apple = reader.state(step)
+        print(f"step {step}, length {snake.getLength()}")
+        print(render(snake, apple, reader.rows, reader.columns))
+    reader.close()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+
+
+def agent_fingerprint(agent):
+    """
+        Summarize the settings that determine an agent's decisions, so cached decisions
+        are only reused by an agent configured the same way.
+
+        :param agent: Agent object.
+        :return: Hex digest of the board size, strategy phases, decision deadline and AgentParams.
+    """
+
+    settings = {
+        "rows": agent.rows,
+        "columns": agent.columns,
+        "phases": [[length, list(planners), scorer] for length, planners, scorer in agent.phases],
+        "deadline": agent.deadline,
+        "params": agent.params.toDict(),
+    }
+    return hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+class TranspositionCache:
+    def __init__(self, capacity = 65536, path = None, fingerprint = None):
+        """
+            Initialize the cache of agent decisions keyed by board state.
+
+            A state is the ordered snake body and the apple; its key is the snake's
+            incremental Zobrist hash (Snake.zobrist) XORed with the apple's key, so a lookup
+            costs one dictionary access. The least recently used decisions are evicted
+            first. Keys are 64-bit and drawn from a fixed seed, so a cache saved by one
+            run or process is valid in another on the same board size.
+
+            Decisions depend on the agent's configuration, so the cache carries its
+            fingerprint (see agent_fingerprint) and refuses files saved under another one.
+
+            :param capacity: Maximum number of decisions kept.
+            :param path: Pickle file to load decisions from when it exists (see save).
+            :param fingerprint: Fingerprint of the agent the decisions belong to, None if unchecked.
+        """
+
+        self.capacity = capacity
+        self.fingerprint = fingerprint
+        self.entries = OrderedDict()
+        # Decisions stored since the last call to drain, e.g. to send them from a worker process
+        self.fresh = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def key(self, snake, apple):
+        """
+            Get the key of a board state.
+
+            :param snake: Snake object.
+            :param apple: Tuple (row, col) of the apple's position, or None.
+            :return: 64-bit integer key.
+        """
+
+        if apple is None:
+            return snake.zobrist
+        return snake.zobrist ^ snake.geometry.zobristApple[snake.geometry.index(apple)]
+
+    def get(self, key):
+        """
+            Look up a decision.
+
+            :param key: State key from key().
+            :return: Tuple of directions, None if the state is not cached.
+        """
+
+        path = self.entries.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return path
+
+    def put(self, key, path):
+        """
+            Store a decision, evicting the least recently used one when full.
+
+            :param key: State key from key().
+            :param path: List of directions decided for the state.
+        """
+
+        path = tuple(path)
+        self.entries[key] = path
+        self.entries.move_to_end(key)
+        self.fresh.append((key, path))
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+            Get the cache counters.
+
+            :return: Dictionary with hits, misses, hit rate, evictions and number of entries.
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+        }
+
+    def drain(self):
+        """
+            Get the decisions stored since the last call, and forget them.
+
+            :return: List of (key, path) pairs in the order they were stored.
+        """
+
+        fresh, self.fresh = self.fresh, []
+        return fresh
+
+    def merge(self, entries):
+        """
+            Add decisions made elsewhere, e.g. by the agents of pool workers.
+
+            :param entries: Iterable of (key, path) pairs, as returned by drain.
+        """
+
+        for key, path in entries:
+            self.put(key, path)
+
+    def save(self, path):
+        """
+            Write the cached decisions and the fingerprint to a pickle file, replacing it atomically.
+
+            :param path: Output file.
+        """
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            data = {"fingerprint": self.fingerprint, "entries": list(self.entries.items())}
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """
+            Add the decisions of a file written by save, e.g. by another run.
+
+            :param path: Pickle file.
+            :raise ValueError: If the file was saved under another agent fingerprint.
+        """
+
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        fingerprint = data.get("fingerprint") if isinstance(data, dict) else None
+        if self.fingerprint is not None and fingerprint != self.fingerprint:
+            raise ValueError(f"{path} holds decisions of another agent configuration "
+                             f"({fingerprint} instead of {self.fingerprint})")
+        self.merge(data["entries"])
+        self.fresh = []
@@ -0,0 +1,273 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from Agent import Agent
+from Campaign import stream_seed
+from Results import RunningStats
+from Strategies import AgentParams, DEFAULT_PHASES
+from simulation import simulate_once
+from config import ROWS, COLUMNS
+
+# Search space: parameter -> (low, high) for a uniform float, or a list of choices
+SPACE = {
+    "threshold_base": (0.2, 0.6),
+    "threshold_fill": (0.0, 0.6),
+    "ratio_weight": (0.2, 0.8),
+    "order": [list(order) for order in itertools.permutations(DEFAULT_PHASES[0][1])],
+}
+
+
+def sample_params(n, seed = 0, space = SPACE):
+    """
+        Draw random Agent parameter sets, the defaults first.
+
+        Only the ratio of the two score weights changes which candidate wins, so the
+        length weight is set to 1 - ratio_weight.
+
+        :param n: Number of parameter sets.
+        :param seed: Seed of the sampling.
+        :param space: Search space, see SPACE.
+        :return: List of AgentParams dictionaries.
+    """
+
+    rng = random.Random(seed)
+    configs = [AgentParams().toDict()]
+    while len(configs) < n:
+        params = {}
+        for name, domain in space.items():
+            params[name] = rng.choice(domain) if isinstance(domain, list) else round(rng.uniform(*domain), 3)
+        if "ratio_weight" in params:
+            params["length_weight"] = round(1 - params["ratio_weight"], 3)
+        configs.append(AgentParams.fromDict(params).toDict())
+    return configs[:n]
+
+
+_tuning_config = None
+
+def _init_tuning_worker(rows, cols, time_limit):
+    """
+        Store the game settings of a tuning run in a pool worker process.
+
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param time_limit: Maximum allowed time per game in seconds.
+    """
+
+    global _tuning_config
+    _tuning_config = (rows, cols, time_limit)
+
+
+def _play_config(task):
+    """
+        Play one game of one parameter set with a fresh agent.
+
+        :param task: Tuple (parameter set index, AgentParams dictionary, game seed).
+        :return: Tuple (parameter set index, (score, steps, time_survived, reached_time_limit)).
+    """
+
+    index, params, seed = task
+    rows, cols, time_limit = _tuning_config
+    return index, simulate_once(rows, cols, Agent(rows, cols, params=params), time_limit, seed)
+
+
+class Tuner:
+    def __init__(self, configs, rows = ROWS, cols = COLUMNS, time_limit = 120.0, seed = 0, games = 4, eta = 3,
+                 maxGames = None):
+        """
+            Initialize a successive halving search over Agent parameter sets.
+
+            Every rung plays the surviving parameter sets on the same new games (common
+            random seeds, so they are compared on identical apple sequences), ranks them by
+            mean score over all the games they played, keeps the best 1/eta and multiplies
+            the number of games by eta. Losing sets thus stop after a few games and the
+            budget goes to the promising ones.
+
+            :param configs: List of AgentParams dictionaries (see sample_params).
+            :param rows: Number of rows in the game board.
+            :param cols: Number of columns in the game board.
+            :param time_limit: Maximum allowed time per game in seconds.
+            :param seed: Seed of the game streams (see Campaign.stream_seed).
+            :param games: Games per parameter set in the first rung.
+            :param eta: Reduction factor: 1/eta of the sets survive each rung.
+            :param maxGames: Games per parameter set after which the search stops even if
+                             several sets remain, None to go on until one is left.
+        """
+
+        self.configs = configs
+        self.rows = rows
+        self.cols = cols
+        self.time_limit = time_limit
+        self.seed = seed
+        self.games = games
+        self.eta = eta
+        self.maxGames = maxGames
+
+        self.scores = [RunningStats() for _ in configs]
+        self.reached = [0] * len(configs)
+        # Parameter set index -> rung it was eliminated at, None while it survives
+        self.eliminated = [None] * len(configs)
+        self.rungs = []
+
+    def _rank(self, indices):
+        """
+            Sort parameter sets from best to worst.
+
+            :param indices: Parameter set indices.
+            :return: Sorted list, by mean score then number of games reaching the time limit.
+        """
+
+        return sorted(indices, key=lambda i: (-self.scores[i].mean, -self.reached[i], i))
+
+    def run(self, workers = 1, report = None):
+        """
+            Run the search.
+
+            :param workers: Number of worker processes.
+            :param report: JSON file rewritten with the ranking after every rung, None to write none.
+            :return: Report dictionary (see report).
+        """
+
+        settings = (self.rows, self.cols, self.time_limit)
+        pool = None
+        if workers > 1:
+            pool = Pool(workers, initializer=_init_tuning_worker, initargs=settings)
+        else:
+            _init_tuning_worker(*settings)
+
+        alive = list(range(len(self.configs)))
+        played, budget = 0, self.games
+        finished = False
+        try:
+            # A single survivor has won: stop before spending another rung of games on it
+            while len(alive) > 1 or not self.rungs:
+                start = time.time()
+                seeds = [stream_seed(self.seed, k) for k in range(played, budget)]
+                tasks = [(i, self.configs[i], seed) for i in alive for seed in seeds]
+                # Results come back in task order (by candidate, then seed), so the statistics and
+                # the ranking of tied candidates do not depend on which worker finishes first
+                if pool is not None:
+                    results = pool.imap(_play_config, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+                else:
+                    results = map(_play_config, tasks)
+                for i, (score, steps, time_survived, reached_limit) in results:
+                    self.scores[i].add(score)
+                    self.reached[i] += bool(reached_limit)
+                played = budget
+
+                ranked = self._rank(alive)
+                rung = len(self.rungs)
+                self.rungs.append({
+                    "rung": rung,
+                    "configs": len(alive),
+                    "games": played,
+                    "best": ranked[0],
+                    "best_mean_score": self.scores[ranked[0]].mean,
+                    "elapsed_s": time.time() - start,
+                })
+                print(f"Rung {rung}: {len(alive)} configurations x {played} games, "
+                      f"best #{ranked[0]} mean score {self.scores[ranked[0]].mean:.2f}")
+
+                if self.maxGames is not None and played >= self.maxGames:
+                    if report:
+                        self.write(report)
+                    break
+                keep = max(1, len(alive) // self.eta)
+                for i in ranked[keep:]:
+                    self.eliminated[i] = rung
+                alive = ranked[:keep]
+                budget = played * self.eta
+                if self.maxGames is not None:
+                    budget = min(budget, self.maxGames)
+                if report:
+                    self.write(report)
+            finished = True
+        finally:
+            if pool is not None:
+                if finished:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+        return self.report()
+
+    def report(self):
+        """
+            Rank every parameter set: those that survived longer first, then by mean score.
+
+            :return: Dictionary with the search settings, the rungs and the ranking, each
+                     entry holding the parameters, games played, score mean and standard
+                     deviation, percentage of games reaching the time limit and last rung.
+        """
+
+        last = len(self.rungs)
+        rung = [last if e is None else e for e in self.eliminated]
+        order = sorted(range(len(self.configs)), key=lambda i: (-rung[i], -self.scores[i].mean, -self.reached[i], i))
+        ranking = []
+        for rank, i in enumerate(order, 1):
+            games = self.scores[i].n
+            ranking.append({
+                "rank": rank,
+                "config": i,
+                "params": self.configs[i],
+                "games": games,
+                "mean_score": self.scores[i].mean,
+                "std_score": self.scores[i].std(),
+                "percent_reached_limit": self.reached[i] / games * 100 if games else 0.0,
+                "rung": rung[i],
+            })
+        return {
+            "settings": {"rows": self.rows, "cols": self.cols, "time_limit": self.time_limit, "seed": self.seed,
+                         "games": self.games, "eta": self.eta, "max_games": self.maxGames,
+                         "configs": len(self.configs)},
+            "rungs": self.rungs,
+            "ranking": ranking,
+        }
+
+    def write(self, path):
+        """
+            Write the report to a JSON file, replacing it atomically.
+
+            :param path: Output file.
+        """
+
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(tmp, path)
+
+
+def print_ranking(report, top = 10):
+    """
+        Print the best entries of a tuning report.
+
+        :param report: Dictionary returned by Tuner.report.
+        :param top: Number of entries to print.
+    """
+
+    print(f"{'rank':>4} {'config':>6} {'games':>5} {'score':>7} {'std':>6} {'limit%':>6}  params")
+    for entry in report["ranking"][:top]:
+        params = {k: v for k, v in entry["params"].items() if v is not None}
+        print(f"{entry['rank']:>4} {entry['config']:>6} {entry['games']:>5} {entry['mean_score']:>7.2f} "
+              f"{entry['std_score']:>6.2f} {entry['percent_reached_limit']:>6.1f}  {json.dumps(params)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune Agent parameters by successive halving over simulated games.")
+    parser.add_argument("--configs", type=int, default=81, help="random parameter sets, the defaults included")
+    parser.add_argument("--games", type=int, default=4, help="games per parameter set in the first rung")
+    parser.add_argument("--eta", type=int, default=3, help="1/eta of the parameter sets survive each rung")
+    parser.add_argument("--max-games", type=int, help="stop once the survivors have played this many games")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the parameter sampling and the games")
+    parser.add_argument("--time-limit", type=float, default=120.0, help="time limit per game in seconds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--output", default="tuning.json", help="ranked report JSON file")
+    args = parser.parse_args()
+
+    tuner = Tuner(sample_params(args.configs, args.seed), time_limit=args.time_limit, seed=args.seed,
+                  games=args.games, eta=args.eta, maxGames=args.max_games)
+    print_ranking(tuner.run(args.workers, args.output))
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+from Snake import Snake
+from Agent import Agent
+from Safety import SafetyEvaluator
+from simulation import Game, simulate_once
+from Geometry import board_size
+from config import *
+
+STATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_states.json")
+
+# Board sizes of the scaling benchmark (see Geometry.board_size)
+SCALING_BOARDS = ("small", "normal", "large", "50x50", "100x100")
+
+
+def record_states(path=STATES_FILE, games=3, rows=ROWS, cols=COLUMNS, seed=0, time_limit=120.0):
+    """
+        Play seeded games and save the (body, apple) state of every decision as a benchmark corpus.
+
+        :param path: Output JSON file.
+        :param games: Number of games to record.
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param seed: Seed of the first game; game k uses seed + k.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :return: List of recorded states.
+    """
+
+    agent = Agent(rows, cols)
+    states = []
+    for k in range(games):
+        game = Game(rows, cols, random.Random(seed + k))
+        while game.apple and game.steps * MOVE_INTERVAL < time_limit:
+            states.append({"body": game.snake.getBody(), "apple": game.apple})
+            directions = agent.compute(game.apple, game.snake)
+            if not directions or not all(game.step(d) for d in directions):
+                break
+
+    with open(path, "w") as f:
+        json.dump({"rows": rows, "cols": cols, "states": states}, f, separators=(",", ":"))
+    return states
+
+
+def load_states(path=STATES_FILE):
+    """
+        Load a benchmark corpus, recording it first if the file does not exist.
+
+        :param path: Corpus JSON file.
+        :return: Tuple (rows, cols, states) where each state is a tuple (Snake, apple).
+    """
+
+    if not os.path.exists(path):
+        record_states(path)
+    with open(path) as f:
+        data = json.load(f)
+    rows, cols = data["rows"], data["cols"]
+    states = [
+        (Snake([tuple(cell) for cell in s["body"]], rows, cols), tuple(s["apple"]))
+        for s in data["states"]
+    ]
+    return rows, cols, states
+
+
+def _time(fn, repeat):
+    """
+        Time a call, keeping the best of several runs.
+
+        :param fn: Callable to time.
+        :param repeat: Number of runs.
+        :return: Best run time in seconds.
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_compute(rows, cols, states, repeat=3, bucket=20):
+    """
+        Time Agent.compute on every corpus state, grouped by snake length.
+
+        A fresh agent is used for each state so no state carried between decisions
+        makes a decision look cheaper than it is.
+
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param states: List of (Snake, apple) states.
+        :param repeat: Runs per state, the best one is kept.
+        :param bucket: Width of the snake length buckets.
+        :return: Dictionary {"<low>-<high>": {"n", "mean_ms", "max_ms"}}.
+    """
+
+    times = {}
+    for snake, apple in states:
+        seconds = _time(lambda: Agent(rows, cols).compute(apple, snake), repeat)
+        low = snake.getLength() // bucket * bucket
+        times.setdefault(low, []).append(seconds * 1000)
+
+    return {
+        f"{low}-{low + bucket - 1}": {"n": len(t), "mean_ms": statistics.mean(t), "max_ms": max(t)}
+        for low, t in sorted(times.items())
+    }
+
+
+def bench_searches(rows, cols, states, repeat=3):
+    """
+        Time the searches used by Agent.compute separately, over the whole corpus.
+
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param states: List of (Snake, apple) states.
+        :param repeat: Runs per state, the best one is kept.
+        :return: Dictionary {search name: mean time per call in microseconds}.
+    """
+
+    agent = Agent(rows, cols)
+    # Repeated runs would otherwise time cache hits instead of the evaluation
+    agent.safety = SafetyEvaluator(agent.geometry, cacheSize=0)
+    searches = {
+        "_find_path": lambda snake, apple: agent._find_path(apple, snake, use_body_hugging=False),
+        "_find_path_body": lambda snake, apple: agent._find_path(apple, snake, use_body_hugging=True),
+        "_a_star": lambda snake, apple: agent._a_star(apple, snake),
+        "_reachable_ratio": lambda snake, apple: agent._reachable_ratio(snake.getBody()),
+    }
+
+    results = {}
+    for name, search in searches.items():
+        total = sum(_time(lambda: search(snake, apple), repeat) for snake, apple in states)
+        results[name] = total / len(states) * 1e6
+    return results
+
+
+def bench_games(n=20, rows=ROWS, cols=COLUMNS, seed=0, time_limit=120.0):
+    """
+        Measure simulation throughput with simulate_once on seeded games.
+
+        :param n: Number of games.
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param seed: Seed of the first game; game k uses seed + k.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :return: Dictionary with games per second, steps per second and mean score.
+    """
+
+    agent = Agent(rows, cols)
+    start = time.perf_counter()
+    results = [simulate_once(rows, cols, agent, time_limit, seed + k) for k in range(n)]
+    elapsed = time.perf_counter() - start
+
+    return {
+        "games_per_s": n / elapsed,
+        "steps_per_s": sum(r[1] for r in results) / elapsed,
+        "mean_score": statistics.mean(r[0] for r in results),
+    }
+
+
+def bench_scaling(sizes=SCALING_BOARDS, decisions=150, seed=0):
+    """
+        Measure the latency of Agent.compute as the board grows, on seeded games of each size.
+
+        Games are played one after another until the number of decisions is reached,
+        so every size is timed on the same number of decisions from the start of a game.
+
+        :param sizes: Board profiles (see Geometry.board_size).
+        :param decisions: Number of decisions timed per size.
+        :param seed: Seed of the first game of each size; game k uses seed + k.
+        :return: Dictionary {"<rows>x<columns>": {"cells", "n", "mean_ms", "p90_ms", "max_ms", "mean_length"}}.
+    """
+
+    results = {}
+    for size in sizes:
+        rows, cols = board_size(size)
+        agent = Agent(rows, cols)
+        times, lengths = [], []
+        k = 0
+        while len(times) < decisions:
+            game = Game(rows, cols, random.Random(seed + k))
+            k += 1
+            while game.apple and len(times) < decisions:
+                lengths.append(game.snake.getLength())
+                start = time.perf_counter()
+                directions = agent.compute(game.apple, game.snake)
+                times.append((time.perf_counter() - start) * 1000)
+                if not directions or not all(game.step(d) for d in directions):
+                    break
+
+        times.sort()
+        results[f"{rows}x{cols}"] = {
+            "cells": rows * cols,
+            "n": len(times),
+            "mean_ms": statistics.mean(times),
+            "p90_ms": times[int(0.9 * (len(times) - 1))],
+            "max_ms": times[-1],
+            "mean_length": statistics.mean(lengths),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.10):
+    """
+        Compare results against a baseline and list the metrics that regressed.
+
+        Times regress when they grow, throughputs when they shrink.
+
+        :param results: Benchmark results.
+        :param baseline: Baseline results with the same layout.
+        :param tolerance: Relative change allowed before reporting a regression.
+        :return: List of (metric, baseline value, new value) tuples.
+    """
+
+    regressions = []
+
+    def walk(new, old, name):
+        if isinstance(new, dict):
+            for key in new:
+                if isinstance(old, dict) and key in old:
+                    walk(new[key], old[key], f"{name}.{key}" if name else key)
+            return
+        if not isinstance(new, (int, float)) or name.endswith((".n", ".cells", "mean_length")) or not old:
+            return
+        change = (new - old) / old
+        if name.endswith("_per_s") or name.endswith("mean_score"):
+            change = -change
+        if change > tolerance:
+            regressions.append((name, old, new))
+
+    walk(results, baseline, "")
+    return regressions
+
+
+def run(games=20, repeat=3, scaling=None):
+    """
+        Run the whole benchmark suite.
+
+        :param games: Number of games for the throughput benchmark.
+        :param repeat: Runs per state for the decision benchmarks.
+        :param scaling: Board profiles for the scaling benchmark, None to skip it.
+        :return: Dictionary of results.
+    """
+
+    rows, cols, states = load_states()
+    results = {
+        "compute_by_length": bench_compute(rows, cols, states, repeat),
+        "searches_us": bench_searches(rows, cols, states, repeat),
+        "simulation": bench_games(games, rows, cols),
+    }
+    if scaling:
+        results["scaling"] = bench_scaling(scaling)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Agent.compute and simulation throughput.")
+    parser.add_argument("--games", type=int, default=20, help="games for the throughput benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per corpus state")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this results JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--record", action="store_true", help="re-record the board state corpus first")
+    parser.add_argument("--scaling", nargs="*", metavar="BOARD",
+                        help="also time decisions per board size (profiles or <rows>x<columns>, "
+                             "default: " + " ".join(SCALING_BOARDS) + ")")
+    args = parser.parse_args()
+
+    if args.record:
+        record_states()
+
+    scaling = args.scaling
+    if scaling is not None and not scaling:
+        scaling = SCALING_BOARDS
+    results = run(args.games, args.repeat, scaling)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.4g} -> {new:.4g}")
+        if regressions:
+            raise SystemExit(1)
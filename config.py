@@ -1,11 +1,52 @@
-# Normal size board dimensions on Google Snake
-ROWS = 15
-COLUMNS = 17
+from Geometry import board_size
+from Strategies import DEFAULT_PHASES
 
-TILE_SIZE = 35  # Pixels size of each box, approx 35.4
+# Board size on Google Snake: "small", "normal", "large" or a custom "<rows>x<columns>"
+BOARD = "normal"
+ROWS, COLUMNS = board_size(BOARD)
+
+# Width in pixels of the board on screen, the same for every board size
+BOARD_WIDTH = 603.5
+TILE_SIZE = BOARD_WIDTH / COLUMNS  # Pixels between tile starts, 35.5 on the normal board
 # Coordinates of top left box (Deafult -> Google Chrome dark theme, full screen)
 TOP = 310 # y coordinates 
 LEFT = 434 # x coordinates 
 
 # Time interval of snake moving box to box
 MOVE_INTERVAL = 0.135 
+
+# Key sending backend: "keyboard" (portable), "uinput" (Linux virtual keyboard, needs /dev/uinput access)
+# or "recording" (keys are only recorded)
+INPUT_BACKEND = "keyboard"
+
+# Fixed key-to-visible-move latency in seconds (None -> the last one measured, see LATENCY_FILE)
+INPUT_LATENCY = None
+
+# Measure the latency by turning the snake a few times when the game starts (replaces INPUT_LATENCY)
+CALIBRATE_LATENCY = False
+
+# File keeping the last measured latency for later games (None -> not kept; without one the
+# move scheduler's default of 30 ms is used)
+LATENCY_FILE = "latency.json"
+
+# Run capture, planning and key dispatch concurrently (False -> sequential loop)
+PIPELINED = False
+
+# File receiving the move timing histogram when the game loop ends
+TIMING_REPORT = "timing.json"
+
+# JSON lines file receiving one record per agent decision (None -> profiling disabled)
+PROFILE = None
+
+# Binary trace of the live game, readable with `python Trace.py <file>` (None -> not recorded)
+TRACE = None
+
+# Agent strategies per game phase: (minimum snake length, planner names, scorer name),
+# names from the registries in Strategies.py (DEFAULT_PHASES -> BFS, body-hugging BFS and A*)
+STRATEGY_PHASES = DEFAULT_PHASES
+
+# Boards with more cells than this plan their searches within corridors of regions (see Regions.py)
+REGION_MIN_CELLS = 1024
+
+# Time budget of one agent decision in seconds, planners then run in a thread pool (None -> no limit)
+DECISION_DEADLINE = None
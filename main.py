@@ -1,12 +1,33 @@
 from config import *
+from Control import CONTROLS
 from Environment import Environment
+from Profiler import Profiler
+from Trace import TraceWriter
 
 import time
 
 if __name__ == "__main__":
-    environment = Environment(ROWS, COLUMNS, TILE_SIZE, TOP, LEFT, MOVE_INTERVAL)
+    environment = Environment(ROWS, COLUMNS, TILE_SIZE, TOP, LEFT, MOVE_INTERVAL, control=CONTROLS[INPUT_BACKEND]())
+    environment.inputLatency = INPUT_LATENCY
+    environment.calibrate = CALIBRATE_LATENCY
+    environment.latencyFile = LATENCY_FILE
+    if PROFILE:
+        environment.agent.profiler = Profiler(PROFILE)
+    if TRACE:
+        environment.trace = TraceWriter(TRACE, ROWS, COLUMNS)
 
     print("You have 3 seconds to switch to the game window...")
     time.sleep(3)
 
-    environment.play()
\ No newline at end of file
+    try:
+        if PIPELINED:
+            environment.playPipelined()
+        else:
+            environment.play()
+    finally:
+        environment.scheduler.exportHistogram(TIMING_REPORT)
+        environment.control.close()
+        if environment.agent.profiler:
+            environment.agent.profiler.close()
+        if environment.trace:
+            environment.trace.close()
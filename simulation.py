@@ -1,29 +1,88 @@
 import random
 import statistics  
+import os
+import time
+from multiprocessing import Pool
 
 from Snake import Snake
 from Agent import Agent
+from Profiler import Profiler
+from Trace import TraceWriter
+from Results import ResultsSink
+from Transposition import TranspositionCache, agent_fingerprint
+from Geometry import board_geometry
 from config import *
 
-directionMap = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
-pathMap = {(1, 0): "down", (0, 1): "right", (-1, 0): "up", (0, -1): "left"}
-
 class Game:
-    def __init__(self, rows, cols):
+    def __init__(self, rows, cols, rng = random, snake = None, apple = None):
         """
             Initialize a new Snake game.
 
             :param rows: Number of rows in the game board.
             :param cols: Number of columns in the game board.
+            :param rng: Random generator used to spawn apples (random.Random or the random module).
+            :param snake: Snake to continue from (it is copied), None for a new snake.
+            :param apple: Tuple (row, col) of the apple when continuing from a snake, None to spawn one.
         """
 
         self.rows = rows
         self.cols = cols
-        self.snake = Snake()
-        self.apple = self.spawnApple()
+        self.rng = rng
+        self.geometry = board_geometry(rows, cols)
+        self.snake = snake.copy() if snake is not None else Snake(rows=rows, columns=cols)
+
+        # Free cells as a swap-remove array of flat indices, with the position of each cell in it
+        self.free = []
+        self.freeIndex = [-1] * (rows * cols)
+        for k in range(rows * cols):
+            if not self.snake.isOccupiedIndex(k):
+                self._release(k)
+
+        self.apple = apple if apple is not None else self.spawnApple()
         self.score = 0
         self.steps = 0
 
+    def copy(self, rng = None):
+        """
+            Get an independent game in the same state, e.g. to play out a possible future.
+
+            :param rng: Random generator of the copy, None to share this game's one.
+            :return: Game object.
+        """
+
+        other = Game.__new__(Game)
+        other.rows, other.cols, other.geometry = self.rows, self.cols, self.geometry
+        other.rng = rng if rng is not None else self.rng
+        other.snake = self.snake.copy()
+        other.free = self.free[:]
+        other.freeIndex = self.freeIndex[:]
+        other.apple, other.score, other.steps = self.apple, self.score, self.steps
+        return other
+
+    def _release(self, k):
+        """
+            Add a cell to the free cells.
+
+            :param k: Flat index (row * cols + col) of the cell.
+        """
+
+        self.freeIndex[k] = len(self.free)
+        self.free.append(k)
+
+    def _occupy(self, k):
+        """
+            Remove a cell from the free cells by moving the last free cell into its slot.
+
+            :param k: Flat index (row * cols + col) of the cell.
+        """
+
+        pos = self.freeIndex[k]
+        last = self.free.pop()
+        if last != k:
+            self.free[pos] = last
+            self.freeIndex[last] = pos
+        self.freeIndex[k] = -1
+
     def spawnApple(self):
         """
             Spawn an apple in a random free cell not occupied by the snake.
@@ -31,11 +90,7 @@ class Game:
             :return: Tuple (row, col) of apple's position or None if no free cells.
         """
 
-        free_cells = [
-            (i, j) for i in range(self.rows) for j in range(self.cols)
-            if (i, j) not in self.snake.getBody()
-        ]
-        return random.choice(free_cells) if free_cells else None
+        return divmod(self.rng.choice(self.free), self.cols) if self.free else None
 
     def step(self, direction):
         """
@@ -45,27 +100,26 @@ class Game:
             :return: True if the snake is alive after the move, False if it collides.
         """
 
-        head = self.snake.getHead()
-        dx, dy = directionMap[direction]
-        newHead = (head[0] + dx, head[1] + dy)
-
-        if (newHead[0] < 0 or newHead[0] >= self.rows or
-            newHead[1] < 0 or newHead[1] >= self.cols or
-            newHead in self.snake.getBody()):
+        k = self.geometry.moveTable[direction][self.geometry.index(self.snake.getHead())]
+        if k < 0 or self.snake.isOccupiedIndex(k):
             return False
 
+        newHead = self.geometry.cells[k]
+        self._occupy(k)
         if newHead == self.apple:
             self.snake.move(newHead, grow=True)
             self.apple = self.spawnApple()
             self.score += 1
         else:
+            tail = self.snake.getTail()
             self.snake.move(newHead, grow=False)
+            self._release(self.geometry.index(tail))
 
         self.steps += 1
         return True
 
 
-def simulate_once(rows, cols, agent, time_limit=120.0):
+def simulate_once(rows, cols, agent, time_limit=120.0, seed=None, trace=None):
     """
         Simulate a single game using the provided agent.
 
@@ -73,56 +127,216 @@ def simulate_once(rows, cols, agent, time_limit=120.0):
         :param cols: Number of columns in the game board.
         :param agent: Agent object to control the snake.
         :param time_limit: Maximum allowed time in seconds for the game.
+        :param seed: Seed of the game's own random generator, None to use the global random module.
+        :param trace: File recording the game (see Trace.TraceWriter), None to record nothing.
         :return: Tuple (score, steps, time_survived, reached_time_limit)
     """
 
-    game = Game(rows, cols)
-    while True:
+    game = Game(rows, cols, random.Random(seed) if seed is not None else random)
+    writer = None
+    if trace:
+        writer = TraceWriter(trace, rows, cols, seed)
+        writer.start(game.snake, game.apple)
+
+    result = None
+    while result is None:
         current_time = game.steps * MOVE_INTERVAL
         if current_time >= time_limit:
-            return game.score, game.steps, time_limit, True
+            result = game.score, game.steps, time_limit, True
+            break
 
+        if agent.profiler is not None:
+            agent.profiler.context = {"seed": seed, "step": game.steps}
+        if writer is not None:
+            start = time.perf_counter()
         path = agent.compute(game.apple, game.snake)
+        if writer is not None:
+            writer.decision(len(path), time.perf_counter() - start)
         if not path:
+            result = game.score, game.steps, game.steps * MOVE_INTERVAL, False
             break
 
         for direction in path:
+            apple = game.apple
             alive = game.step(direction)
             if not alive:
-                return game.score, game.steps, game.steps * MOVE_INTERVAL, False
+                result = game.score, game.steps, game.steps * MOVE_INTERVAL, False
+                break
+            if writer is not None:
+                writer.move(direction, apple)
             if game.steps * MOVE_INTERVAL >= time_limit:
-                return game.score, game.steps, time_limit, True
+                result = game.score, game.steps, time_limit, True
+                break
 
-    return game.score, game.steps, game.steps * MOVE_INTERVAL, False
+    if writer is not None:
+        writer.end(result[3], game.score)
+        writer.close()
+    return result
 
 
-def simulate_n_games(n, rows=ROWS, cols=COLUMNS, time_limit=120.0):
+_worker_agent = None
+_worker_config = None
+
+def _init_worker(rows, cols, time_limit, profile=None, trace=None, transpositions=None):
+    """
+        Create the Agent owned by a pool worker process.
+
+        :param rows: Number of rows in the game board.
+        :param cols: Number of columns in the game board.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :param profile: JSON lines file prefix for per-decision profiling, None to disable it.
+        :param trace: Directory receiving one trace per game, None to record nothing.
+        :param transpositions: Transposition cache file to start from, None to cache nothing. The
+                               decisions added by each game are sent back with its result.
+    """
+
+    global _worker_agent, _worker_config
+    _worker_agent = Agent(rows, cols)
+    if profile:
+        _worker_agent.profiler = Profiler(f"{profile}.{os.getpid()}")
+    if transpositions:
+        _worker_agent.transpositions = TranspositionCache(path=transpositions,
+                                                          fingerprint=agent_fingerprint(_worker_agent))
+    _worker_config = (rows, cols, time_limit, trace)
+
+
+def _simulate_seeded(seed):
+    """
+        Simulate one game inside a pool worker.
+
+        :param seed: Seed of the game's random generator.
+        :return: Tuple ((score, steps, time_survived, reached_time_limit), decisions added to the
+                 worker's transposition cache during the game, empty without a cache).
+    """
+
+    rows, cols, time_limit, trace = _worker_config
+    result = simulate_once(rows, cols, _worker_agent, time_limit, seed, trace_file(trace, seed))
+    cache = _worker_agent.transpositions
+    return result, cache.drain() if cache is not None else []
+
+
+def trace_file(directory, seed):
+    """
+        Get the trace file of a seeded game.
+
+        :param directory: Directory holding the traces of a run, or None.
+        :param seed: Seed of the game.
+        :return: File path, None if directory is None.
+    """
+
+    return os.path.join(directory, f"{seed}.trace") if directory else None
+
+
+def game_seeds(n, seed=None):
+    """
+        Build the per-game seeds of a run, so that the same seed set can be replayed serially or in parallel.
+
+        :param n: Number of games.
+        :param seed: Base seed of the run, None to draw one at random.
+        :return: Range of n integer seeds, so runs of any length hold no list of them.
+    """
+
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    return range(seed, seed + n)
+
+
+def simulate_n_games(n, rows=ROWS, cols=COLUMNS, time_limit=120.0, workers=1, seed=None, chunksize=None,
+                     profile=None, trace=None, results=None, progress=None, transpositions=None):
     """
         Simulate multiple games and report statistics.
 
+        Every game gets its own seeded random generator, so for a given seed the
+        statistics are the same whatever the number of workers. Statistics are
+        computed online, so memory stays constant however many games are played.
+
         :param n: Number of games to simulate.
         :param rows: Number of rows in the game board.
         :param cols: Number of columns in the game board.
         :param time_limit: Maximum allowed time per game in seconds.
+        :param workers: Number of worker processes, 1 to play every game in this process.
+        :param seed: Base seed of the run, None to draw one at random.
+        :param chunksize: Number of games sent to a worker at once, None to pick it from n and workers.
+        :param profile: JSON lines file receiving one record per agent decision, None to disable
+                        profiling. With several workers each one writes to <profile>.<pid>.
+        :param trace: Directory receiving a <seed>.trace recording of every game, None to record nothing.
+        :param results: CSV file receiving one row per game, written in batches, None to keep no rows.
+        :param progress: JSON file receiving periodic statistics snapshots, None to write none.
+        :param transpositions: File of an agent decision cache (see Transposition.TranspositionCache),
+                               loaded at the start and saved at the end. Pool workers start from
+                               the file and their new decisions are merged back here. None to
+                               cache nothing.
         :return: Tuple containing statistics:
                  (avg_score, std_score, min_score, max_score,
                   avg_time,  std_time,  min_time,  max_time,
                   percent_reached_limit)
     """
 
-    agent = Agent(rows, cols)
+    seeds = game_seeds(n, seed)
+    if trace:
+        os.makedirs(trace, exist_ok=True)
+    sink = ResultsSink(results, progress)
 
-    scores = []
-    times = []
-    games_reached_limit = 0
+    agent = Agent(rows, cols)
+    cache = None
+    if transpositions:
+        # Checked against the file before any worker starts
+        cache = TranspositionCache(path=transpositions, fingerprint=agent_fingerprint(agent))
+
+    pool = None
+    if workers > 1:
+        if chunksize is None:
+            chunksize = max(1, n // (workers * 8))
+        pool = Pool(workers, initializer=_init_worker, initargs=(rows, cols, time_limit, profile, trace, transpositions))
+
+        def collect():
+            for result, decisions in pool.imap(_simulate_seeded, seeds, chunksize):
+                if cache is not None:
+                    cache.merge(decisions)
+                yield result
+        games = collect()
+    else:
+        if profile:
+            agent.profiler = Profiler(profile)
+        agent.transpositions = cache
+        games = (simulate_once(rows, cols, agent, time_limit, s, trace_file(trace, s)) for s in seeds)
+
+    finished = False
+    try:
+        for game_seed, (score, steps, time_survived, reached_limit) in zip(seeds, games):
+            sink.add(game_seed, score, steps, time_survived, reached_limit)
+        finished = True
+    finally:
+        sink.close()
+        if pool is not None:
+            if finished:
+                pool.close()
+            else:
+                # Interrupted or failed: do not wait for the games still queued in the workers
+                pool.terminate()
+            pool.join()
+        if cache is not None:
+            cache.save(transpositions)
+            print(f"Transposition cache: {cache.stats()}")
+
+    return report_results(sink, time_limit)
+
+
+def report(scores, times, games_reached_limit, time_limit):
+    """
+        Compute and print the statistics of a set of finished games.
 
-    for _ in range(n):
-        score, steps, time_survived, reached_limit = simulate_once(rows, cols, agent, time_limit)
-        scores.append(score)
-        times.append(time_survived)
-        if reached_limit:
-            games_reached_limit += 1
+        :param scores: List of final scores, one per game.
+        :param times: List of survival times in seconds, one per game.
+        :param games_reached_limit: Number of games that reached the time limit.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :return: Tuple containing statistics:
+                 (avg_score, std_score, min_score, max_score,
+                  avg_time,  std_time,  min_time,  max_time,
+                  percent_reached_limit)
+    """
 
+    n = len(scores)
     avg_score = statistics.mean(scores)
     avg_time  = statistics.mean(times)
 
@@ -136,6 +350,46 @@ def simulate_n_games(n, rows=ROWS, cols=COLUMNS, time_limit=120.0):
 
     percent_reached_limit = (games_reached_limit / n) * 100
 
+    stats = (avg_score, std_score, min_score, max_score,
+             avg_time,  std_time,  min_time,  max_time,
+             percent_reached_limit)
+    _print_report(n, stats, time_limit)
+    return stats
+
+
+def report_results(results, time_limit):
+    """
+        Print the statistics collected by a ResultsSink, with their quantiles.
+
+        :param results: Results.ResultsSink holding the finished games.
+        :param time_limit: Maximum allowed time per game in seconds.
+        :return: Tuple of statistics, see report.
+    """
+
+    summary = results.summary()
+    score, times = summary["score"], summary["time"]
+    stats = (score["mean"], score["std"], score["min"], score["max"],
+             times["mean"], times["std"], times["min"], times["max"],
+             summary["percent_reached_limit"])
+    _print_report(summary["games"], stats, time_limit)
+    print(f"  Score p10/p50/p90: {score['p10']:.1f} / {score['p50']:.1f} / {score['p90']:.1f}"
+          f"   Time p10/p50/p90: {times['p10']:.2f} / {times['p50']:.2f} / {times['p90']:.2f} s")
+    return stats
+
+
+def _print_report(n, stats, time_limit):
+    """
+        Print a statistics tuple.
+
+        :param n: Number of games.
+        :param stats: Tuple of statistics, see report.
+        :param time_limit: Maximum allowed time per game in seconds.
+    """
+
+    (avg_score, std_score, min_score, max_score,
+     avg_time,  std_time,  min_time,  max_time,
+     percent_reached_limit) = stats
+
     print(f"\nAfter {n} games (limit {time_limit}s):")
     print(f"  Average score: {avg_score:.2f}   Std dev: {std_score:.2f}")
     print(f"    Min score: {min_score}   Max score: {max_score}")
@@ -143,8 +397,5 @@ def simulate_n_games(n, rows=ROWS, cols=COLUMNS, time_limit=120.0):
     print(f"    Min time: {min_time:.2f} s   Max time: {max_time:.2f} s")
     print(f"  % games reaching {time_limit}s: {percent_reached_limit:.1f}%")
 
-    return (avg_score, std_score, min_score, max_score,
-            avg_time,  std_time,  min_time,  max_time,
-            percent_reached_limit)
-
-simulate_n_games(1000, time_limit=120.0)
\ No newline at end of file
+if __name__ == "__main__":
+    simulate_n_games(1000, time_limit=120.0, workers=os.cpu_count() or 1)
\ No newline at end of file
@@ -0,0 +1,72 @@
+import numpy as np
+
+from Capture import ReplayCapture
+from Control import RecordingControl
+from Environment import Environment
+
+ROWS, COLUMNS, TILE = 8, 14, 4
+STEPS = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+
+class ReplayGame:
+    """
+        Snake that moves two tiles after every turn key, recorded as frames of a ReplayCapture.
+    """
+
+    def __init__(self):
+        self.body = [(4, 3), (4, 2), (4, 1)]
+        self.bodies = [self.body]
+        self.capture = ReplayCapture([self.frame()])
+        self.step((0, 1))
+        self.step((0, 1))
+
+    def frame(self):
+        image = np.zeros((ROWS * TILE, COLUMNS * TILE, 3), dtype=np.uint8)
+        for i, j in self.body:
+            image[i * TILE:(i + 1) * TILE, j * TILE:(j + 1) * TILE] = (0, 0, 255)
+        return image
+
+    def step(self, direction):
+        head = self.body[0]
+        self.body = [(head[0] + direction[0], head[1] + direction[1])] + self.body[:-1]
+        self.bodies.append(self.body)
+        self.capture.frames.append(self.frame())
+
+    def onKey(self, key, timestamp):
+        if key in STEPS:
+            self.step(STEPS[key])
+            self.step(STEPS[key])
+
+
+def environment(game, path):
+    env = Environment(ROWS, COLUMNS, TILE, 0, 0, 0.1, control=RecordingControl(onKey=game.onKey),
+                      capture=game.capture)
+    env.calibrate = True
+    env.latencyFile = str(path)
+    return env
+
+
+def test_calibration_turns_and_rebuilds_snake(tmp_path):
+    game = ReplayGame()
+    env = environment(game, tmp_path / "latency.json")
+
+    latency = env.calibrateLatency(samples=6, timeout=0.5)
+
+    assert latency is not None and latency >= 0
+    assert len(env.latencySamples) == 6
+    assert [key for _, key in env.control.keys] == ["up", "right", "down", "right", "up", "right"]
+    # Calibration stops at the frame showing the last turn
+    assert env.snake.getBody() == game.bodies[game.capture.index - 1]
+
+
+def test_measured_latency_is_kept_for_later_games(tmp_path):
+    path = tmp_path / "latency.json"
+    env = environment(ReplayGame(), path)
+    env.startGame()
+    assert path.exists()
+
+    later = environment(ReplayGame(), path)
+    later.calibrate = False
+    later.startGame()
+    assert later.scheduler.firstOffset == env.scheduler.firstOffset
+    assert later.control.keys[-1][1] == "space"